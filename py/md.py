@@ -5,14 +5,41 @@
 # ///
 """md - A tool for manipulating markdown files."""
 
+import ctypes
+import ctypes.util
+import functools
+import glob
+import hashlib
+import json
+import math
+import mmap
+import os
 import re
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
 import tempfile
+import threading
+import time
+import tracemalloc
 import webbrowser
-from dataclasses import dataclass, field
+from collections import deque
+from collections.abc import Callable, Generator, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from typing import TypeVar
 
 import typer
 from markdown_it import MarkdownIt
+from markdown_it import __version__ as MARKDOWN_IT_VERSION
+from markdown_it.common.utils import normalizeReference
+from markdown_it.token import Token
 
 app = typer.Typer(
     context_settings={"help_option_names": ["-h", "--help"]},
@@ -32,23 +59,44 @@ def main(ctx: typer.Context) -> None:
 # ---------------------------------------------------------------------------
 
 
-@dataclass
+# Span content is resolved against the memory-mapped input file. Empty files
+# can't be mapped, so those are represented by b"".
+Source = mmap.mmap | bytes
+
+
+@dataclass(slots=True)
+class Span:
+    """A run of consecutive source lines, kept as a byte range into the file
+    instead of copied text. *end* excludes the final line's newline."""
+
+    start: int
+    end: int
+    lines: int
+
+
+@dataclass(slots=True)
 class Section:
     heading: str
     level: int
-    content: list[str] = field(default_factory=list)
+    # Each entry is either a single line or a Span of lines in the source.
+    content: list[str | Span] = field(default_factory=list)
     children: list["Section"] = field(default_factory=list)
+    # Cached line_count(). Code that mutates content or children after the
+    # count has been taken must update or reset it.
+    _lines: int | None = field(default=None, init=False, repr=False, compare=False)
 
     def line_count(self) -> int:
         """Total content lines in this section and all descendants."""
-        total = len(self.content)
-        for child in self.children:
-            total += child.line_count() + 1  # +1 for the heading line
-        return total
-
-    def flatten(self) -> list[str]:
+        if self._lines is None:
+            total = _chunk_lines(self.content)
+            for child in self.children:
+                total += child.line_count() + 1  # +1 for the heading line
+            self._lines = total
+        return self._lines
+
+    def flatten(self) -> list[str | Span]:
         """Render this section back to markdown lines."""
-        lines: list[str] = []
+        lines: list[str | Span] = []
         if self.heading:
             lines.append(f"{'#' * self.level} {self.heading}")
         lines.extend(self.content)
@@ -57,6 +105,21 @@ class Section:
         return lines
 
 
+def _chunk_lines(chunks: list[str | Span]) -> int:
+    return sum(c.lines if isinstance(c, Span) else 1 for c in chunks)
+
+
+@contextmanager
+def _mapped(path: Path) -> Iterator[Source]:
+    """Memory-map *path* read-only for use as a Span source."""
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
 # ---------------------------------------------------------------------------
 # Parsing
 # ---------------------------------------------------------------------------
@@ -124,6 +187,139 @@ def parse_markdown(text: str) -> Section:
     return root
 
 
+def _append_line(content: list[str | Span], start: int, end: int) -> None:
+    # Lines of a section are contiguous in the source, so extend the previous
+    # span when possible and keep one Span per section instead of one per line.
+    if content and isinstance(content[-1], Span) and content[-1].end + 1 == start:
+        content[-1].end = end
+        content[-1].lines += 1
+    else:
+        content.append(Span(start, end, 1))
+
+
+def parse_markdown_stream(source: Source) -> Section:
+    """Single-pass variant of parse_markdown for files too large to hold in
+    memory.
+
+    *source* is the memory-mapped file (see _mapped); lines are scanned in
+    place and section content is stored as Spans into it rather than copied
+    strings, so it must stay mapped until the tree has been written. The tree
+    is built with raw heading levels (only their relative order matters for
+    nesting) and normalized once the minimum level is known at the end.
+    """
+    root = Section(heading="", level=0)
+    stack: list[Section] = [root]
+    in_fence = False
+    min_level = 7
+    size = len(source)
+    pos = 0
+
+    # Like str.split, a final newline yields a trailing empty line.
+    while pos <= size:
+        nl = source.find(b"\n", pos)
+        end = size if nl < 0 else nl
+        raw = source[pos:end]
+
+        if raw.strip().startswith((b"```", b"~~~")):
+            in_fence = not in_fence
+        elif not in_fence and raw.startswith(b"#"):
+            m = HEADING_RE.match(raw.decode(errors="replace"))
+            if m:
+                level = len(m.group(1))
+                min_level = min(min_level, level)
+                section = Section(heading=m.group(2).strip(), level=level)
+                while len(stack) > 1 and stack[-1].level >= level:
+                    stack.pop()
+                stack[-1].children.append(section)
+                stack.append(section)
+                pos = end + 1
+                continue
+
+        _append_line(stack[-1].content, pos, end)
+        pos = end + 1
+
+    _normalize_levels(root, min_level)
+    return root
+
+
+def _normalize_levels(root: Section, min_level: int) -> None:
+    """Shift heading levels under *root* so *min_level* becomes level 1."""
+    offset = (min_level - 1) if min_level < 7 else 0
+    if offset:
+        pending = list(root.children)
+        while pending:
+            section = pending.pop()
+            section.level -= offset
+            pending.extend(section.children)
+
+
+def _front_matter_lines(lines: list[str]) -> int:
+    """How many of *lines* a leading YAML front matter block (`---` to `---`
+    or `...`) takes up, or 0 if there isn't one."""
+    if not lines or lines[0].rstrip() != "---":
+        return 0
+    for i in range(1, len(lines)):
+        if lines[i].rstrip() in ("---", "..."):
+            return i + 1
+    return 0
+
+
+def parse_markdown_tokens(text: str, tokens: list[Token] | None = None) -> Section:
+    """Parse markdown text into a tree of Sections using markdown-it's block
+    tokens rather than HEADING_RE.
+
+    This gets CommonMark semantics for free: setext headings, fences of any
+    length or nesting, indented code, and `#` lines inside blockquotes or
+    lists not counting as sections. The tree is built in a single pass over
+    the top-level heading_open tokens, using their line maps to slice the
+    content between headings, and levels are normalized at the end as in
+    parse_markdown. *tokens* defaults to a fresh parse of *text*; pass
+    markdown-it's tokens for it if the caller has parsed it already (e.g. to
+    render it too), since parses aren't cached across calls.
+    """
+    if tokens is None:
+        tokens = _markdown_it().parse(text)
+    lines = text.split("\n")
+    # markdown-it reads front matter as a thematic break and a setext heading;
+    # keep it in the preamble, as the regex engine does.
+    front_matter = _front_matter_lines(lines)
+
+    root = Section(heading="", level=0)
+    stack: list[Section] = [root]
+    min_level = 7
+    pos = 0
+
+    for i, token in enumerate(tokens):
+        if token.type != "heading_open" or token.level != 0 or not token.map:
+            continue
+        start, end = token.map
+        if start < front_matter:
+            continue
+        stack[-1].content.extend(lines[pos:start])
+        pos = end
+
+        level = int(token.tag[1])
+        min_level = min(min_level, level)
+        # A multi-line setext heading's text spans lines; keep it on one.
+        heading = " ".join(tokens[i + 1].content.split())
+        section = Section(heading=heading, level=level)
+        while len(stack) > 1 and stack[-1].level >= level:
+            stack.pop()
+        stack[-1].children.append(section)
+        stack.append(section)
+
+    stack[-1].content.extend(lines[pos:])
+    _normalize_levels(root, min_level)
+    return root
+
+
+class Engine(str, Enum):
+    """How split finds headings."""
+
+    REGEX = "regex"  # HEADING_RE line scan; supports --stream
+    TOKENS = "tokens"  # markdown-it block tokens (CommonMark semantics)
+
+
 # ---------------------------------------------------------------------------
 # Collapsing
 # ---------------------------------------------------------------------------
@@ -143,6 +339,9 @@ def _merge_sections(sections: list[Section]) -> Section:
         merged.content.append("")
         merged.content.append(f"{'#' * s.level} {s.heading}")
         merged.content.extend(s.content)
+    # Leaves only, so each contributes its content plus a blank + heading line
+    # for all but the first.
+    merged._lines = sum(s.line_count() for s in sections) + 2 * (len(sections) - 1)
     return merged
 
 
@@ -153,6 +352,9 @@ def collapse_small(node: Section, min_lines: int) -> None:
     1. Merge consecutive small leaf siblings into a single file.
     2. If only one small leaf remains with no siblings, collapse it upward
        into its parent's content.
+
+    Line counts are kept up to date on each node as it's rewritten, so the
+    whole pass is linear in the number of sections.
     """
     # Recurse first so leaves are resolved before we inspect them.
     for child in node.children:
@@ -161,13 +363,21 @@ def collapse_small(node: Section, min_lines: int) -> None:
     if not node.children:
         return
 
+    # Children are final now, so their cached counts are current.
+    total = _chunk_lines(node.content)
+    for child in node.children:
+        total += child.line_count() + 1
+
     # -- pass 1: group consecutive small leaves and merge them -------------
     new_children: list[Section] = []
     small_group: list[Section] = []
 
     def flush_small() -> None:
+        nonlocal total
         if small_group:
             new_children.append(_merge_sections(small_group))
+            # Each merged heading after the first gains a blank separator.
+            total += len(small_group) - 1
             small_group.clear()
 
     for child in node.children:
@@ -189,8 +399,205 @@ def collapse_small(node: Section, min_lines: int) -> None:
         node.content.append("")
         node.content.extend(child.flatten())
         node.children = []
+        total += 1  # the blank separator
     else:
         node.children = new_children
+    node._lines = total
+
+
+# Rough bytes per token for English prose with common tokenizers; good enough
+# for sizing chunks, not for counting exactly.
+BYTES_PER_TOKEN = 4
+
+
+def _heading_bytes(section: Section) -> int:
+    if not section.heading:
+        return 0
+    return len(section.heading.encode()) + section.level + 2  # "## " + "\n"
+
+
+def _chunk_bytes(chunks: list[str | Span]) -> int:
+    return sum(
+        c.end - c.start + 1 if isinstance(c, Span) else len(c.encode()) + 1
+        for c in chunks
+    )
+
+
+def _iter_lines(
+    chunks: list[str | Span], source: Source | None
+) -> Iterator[tuple[str | Span, bytes | str]]:
+    """Yield (line, text) for each line in *chunks*, with Spans broken into
+    one single-line Span per line (text is then the raw bytes)."""
+    for chunk in chunks:
+        if not isinstance(chunk, Span):
+            yield chunk, chunk
+            continue
+        start = chunk.start
+        for _ in range(chunk.lines):
+            nl = source.find(b"\n", start, chunk.end)
+            end = chunk.end if nl < 0 else nl
+            yield Span(start, end, 1), source[start:end]
+            start = end + 1
+
+
+def _blocks(
+    chunks: list[str | Span], source: Source | None
+) -> list[tuple[list[str | Span], int]]:
+    """Cut *chunks* into (lines, bytes) blocks that are safe to split between:
+    a block ends after a blank line or a closing code fence, never inside a
+    fence. Blank lines never make a block on their own: they go with the
+    next block, or the last one at the end."""
+    blocks: list[tuple[list[str | Span], int]] = []
+    lines: list[str | Span] = []
+    size = 0
+    has_text = False
+    in_fence = False
+    for line, text in _iter_lines(chunks, source):
+        if isinstance(line, Span):
+            _append_line(lines, line.start, line.end)
+            size += line.end - line.start + 1
+            stripped = text.strip()
+            fence = stripped.startswith((b"```", b"~~~"))
+        else:
+            lines.append(line)
+            size += len(line.encode()) + 1
+            stripped = text.strip()
+            fence = _detect_code_fence(line)
+        has_text = has_text or bool(stripped)
+        if fence:
+            in_fence = not in_fence
+        if has_text and ((fence and not in_fence) or (not stripped and not in_fence)):
+            blocks.append((lines, size))
+            lines, size, has_text = [], 0, False
+    if lines and not has_text and blocks:
+        last, last_size = blocks[-1]
+        last.extend(lines)
+        blocks[-1] = (last, last_size + size)
+    elif lines:
+        blocks.append((lines, size))
+    return blocks
+
+
+def _split_leaf(
+    leaf: Section, max_bytes: int, source: Source | None
+) -> list[tuple[Section, int]]:
+    """Split an oversized leaf into parts of at most *max_bytes* each (a single
+    paragraph or code block larger than that is kept whole), titled
+    "Heading (part 1)" and so on."""
+    parts: list[tuple[list[str | Span], int]] = []
+    budget = max_bytes - _heading_bytes(leaf) - 12  # room for " (part nn)"
+    lines: list[str | Span] = []
+    size = 0
+    for block, block_size in _blocks(leaf.content, source):
+        if lines and size + block_size > budget:
+            parts.append((lines, size))
+            lines, size = [], 0
+        for line in block:
+            if isinstance(line, Span) and lines and isinstance(lines[-1], Span):
+                if lines[-1].end + 1 == line.start:
+                    lines[-1].end = line.end
+                    lines[-1].lines += line.lines
+                    continue
+            lines.append(line)
+        size += block_size
+    if lines or not parts:
+        parts.append((lines, size))
+    if len(parts) == 1:
+        return [(leaf, _heading_bytes(leaf) + size)]
+
+    sections: list[tuple[Section, int]] = []
+    for i, (lines, size) in enumerate(parts, 1):
+        part = Section(
+            heading=f"{leaf.heading} (part {i})", level=leaf.level, content=lines
+        )
+        sections.append((part, _heading_bytes(part) + size))
+    return sections
+
+
+def collapse_by_size(
+    node: Section,
+    min_bytes: int,
+    max_bytes: int | None,
+    source: Source | None = None,
+) -> int:
+    """Bottom-up pass sizing output files by bytes instead of lines, for
+    feeding chunks of bounded size to retrieval pipelines.
+
+    1. Leaves larger than *max_bytes* are split into parts at paragraph or
+       code fence boundaries. So is a larger body ahead of a section's
+       subsections, with the parts becoming its first children.
+    2. Runs of consecutive leaf siblings smaller than *min_bytes* are packed
+       into one file, closing it once it reaches *min_bytes* or the next leaf
+       would push it over *max_bytes*.
+    3. If a single small leaf remains with no siblings, it is folded into its
+       parent's content.
+
+    Each call returns the subtree's size, so sizes are computed once per
+    section and the pass stays linear. Sizes are of the markdown as parsed;
+    written files differ by a few bytes of heading and blank-line fixups.
+    """
+    limit = max_bytes if max_bytes is not None else math.inf
+    content_bytes = _chunk_bytes(node.content)
+    if not node.children:
+        return _heading_bytes(node) + content_bytes
+
+    sized: list[tuple[Section, int]] = []
+    if content_bytes > limit:
+        # An oversized body ahead of subsections would otherwise all land in
+        # index.md; move it out into leading parts like any other big leaf.
+        body = Section(
+            heading=node.heading or "Introduction",
+            level=node.children[0].level,
+            content=node.content,
+        )
+        sized.extend(_split_leaf(body, limit, source))
+        node.content = []
+        content_bytes = 0
+    for child in node.children:
+        size = collapse_by_size(child, min_bytes, max_bytes, source)
+        if not child.children and size > limit:
+            sized.extend(_split_leaf(child, limit, source))
+        else:
+            sized.append((child, size))
+
+    new_children: list[tuple[Section, int]] = []
+    group: list[Section] = []
+    group_size = 0
+
+    def flush() -> None:
+        nonlocal group_size
+        if group:
+            new_children.append((_merge_sections(group), group_size))
+            group.clear()
+            group_size = 0
+
+    for child, size in sized:
+        if child.children or size >= min_bytes:
+            flush()
+            new_children.append((child, size))
+            continue
+        # Each merged heading after the first gains a blank separator.
+        if group and group_size + 1 + size > limit:
+            flush()
+        group_size += size + (1 if group else 0)
+        group.append(child)
+        if group_size >= min_bytes:
+            flush()
+    flush()
+
+    total = _heading_bytes(node) + content_bytes
+    if len(new_children) == 1:
+        child, size = new_children[0]
+        if not child.children and size < min_bytes and total + 1 + size <= limit:
+            node.content.append("")
+            node.content.extend(child.flatten())
+            node.children = []
+            node._lines = None
+            return total + 1 + size
+
+    node.children = [child for child, _ in new_children]
+    node._lines = None
+    return total + sum(size for _, size in new_children)
 
 
 # ---------------------------------------------------------------------------
@@ -198,14 +605,97 @@ def collapse_small(node: Section, min_lines: int) -> None:
 # ---------------------------------------------------------------------------
 
 
-def _strip_blank_edges(lines: list[str]) -> list[str]:
+def _lstrip_chunk(chunk: str | Span, source: Source | None) -> str | Span | None:
+    """Drop leading blank lines from *chunk*; None if nothing is left."""
+    if not isinstance(chunk, Span):
+        return chunk if chunk.strip() else None
+    start, lines = chunk.start, chunk.lines
+    while lines:
+        nl = source.find(b"\n", start, chunk.end)
+        line_end = chunk.end if nl < 0 else nl
+        if source[start:line_end].strip():
+            return Span(start, chunk.end, lines)
+        start, lines = line_end + 1, lines - 1
+    return None
+
+
+def _rstrip_chunk(chunk: str | Span, source: Source | None) -> str | Span | None:
+    """Drop trailing blank lines from *chunk*; None if nothing is left."""
+    if not isinstance(chunk, Span):
+        return chunk if chunk.strip() else None
+    end, lines = chunk.end, chunk.lines
+    while lines:
+        nl = source.rfind(b"\n", chunk.start, end)
+        line_start = chunk.start if nl < 0 else nl + 1
+        if source[line_start:end].strip():
+            return Span(chunk.start, end, lines)
+        end, lines = line_start - 1, lines - 1
+    return None
+
+
+def _strip_blank_edges(
+    lines: list[str | Span], source: Source | None = None
+) -> list[str | Span]:
     start = 0
-    while start < len(lines) and not lines[start].strip():
+    while start < len(lines) and _lstrip_chunk(lines[start], source) is None:
         start += 1
     end = len(lines)
-    while end > start and not lines[end - 1].strip():
+    while end > start and _rstrip_chunk(lines[end - 1], source) is None:
         end -= 1
-    return lines[start:end]
+    if start == end:
+        return []
+    stripped = lines[start:end]
+    stripped[0] = _lstrip_chunk(stripped[0], source)
+    stripped[-1] = _rstrip_chunk(stripped[-1], source)
+    return stripped
+
+
+# os.writev accepts at most IOV_MAX buffers per call.
+_IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+
+def _render(lines: list[str | Span], source: Source | None) -> list[bytes | memoryview]:
+    """Encode *lines* newline-terminated as a list of buffers.
+
+    Spans become memoryview slices of the mapped source rather than decoded
+    per-line strings; runs of plain lines are joined into a single buffer.
+    """
+    view = memoryview(source) if source is not None else None
+    buffers: list[bytes | memoryview] = []
+    pending: list[str] = []
+    for line in lines:
+        if isinstance(line, Span):
+            if pending:
+                buffers.append(("\n".join(pending) + "\n").encode())
+                pending.clear()
+            buffers.append(view[line.start : line.end])
+            buffers.append(b"\n")
+        else:
+            pending.append(line)
+    if pending:
+        buffers.append(("\n".join(pending) + "\n").encode())
+    return buffers
+
+
+def _write_buffers(path: Path, buffers: list[bytes | memoryview]) -> None:
+    """Write *buffers* to *path* with writev, so Span bytes go straight from
+    the mapped source to the kernel."""
+    buffers = list(buffers)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        while buffers:
+            batch = buffers[:_IOV_MAX]
+            written = os.writev(fd, batch)
+            # Drop fully written buffers and resume mid-way through a short one.
+            done = 0
+            while done < len(batch) and written >= len(batch[done]):
+                written -= len(batch[done])
+                done += 1
+            del buffers[:done]
+            if written:
+                buffers[0] = memoryview(buffers[0])[written:]
+    finally:
+        os.close(fd)
 
 
 def _slugify(text: str) -> str:
@@ -221,18 +711,23 @@ def _slugify(text: str) -> str:
     return text or "untitled"
 
 
-def _dedup_slug(slug: str, used: set[str]) -> str:
+def _dedup_slug(slug: str, used: dict[str, int]) -> str:
     """Return a unique slug within *used*, considering both bare names (dirs)
-    and .md names (files) so they never collide on the filesystem."""
+    and .md names (files) so they never collide on the filesystem.
+
+    *used* maps each reserved name to the next suffix to try when it's asked
+    for again, so a heading repeated thousands of times (e.g. "Added" in a
+    changelog) doesn't rescan every earlier suffix."""
     candidate = slug
-    i = 2
+    i = used.get(slug, 2)
     while candidate in used or f"{candidate}.md" in used:
         candidate = f"{slug}-{i}"
         i += 1
+    used[slug] = i
     # Reserve both the bare name and the .md form so a later dir can't
     # collide with an earlier file or vice-versa.
-    used.add(candidate)
-    used.add(f"{candidate}.md")
+    used.setdefault(candidate, 2)
+    used.setdefault(f"{candidate}.md", 2)
     return candidate
 
 
@@ -263,29 +758,36 @@ def _format_index(nodes: list[_Written], path_prefix: str, depth: int) -> list[s
     return lines
 
 
-def write_tree(section: Section, output_dir: Path) -> list[_Written]:
-    """Write the section tree to disk. Each directory gets an index.md
-    containing its heading, preamble, and a nested TOC of descendants."""
-    output_dir.mkdir(parents=True, exist_ok=True)
-    used_slugs: set[str] = {"index", "index.md"}
+# What write_tree puts on disk: a directory (no lines) or a file.
+_Planned = tuple[Path, list[str | Span] | None]
+
+
+def _plan_tree(
+    section: Section, output_dir: Path, source: Source | None
+) -> Generator[_Planned, None, list[_Written]]:
+    """Walk the section tree, yielding each directory before anything in it
+    and each file's lines as the walk reaches it, so only the files being
+    written are held in memory at once. Returns the TOC entries."""
+    yield output_dir, None
+    used_slugs: dict[str, int] = {"index": 2, "index.md": 2}
 
     written: list[_Written] = []
     for child in section.children:
         slug = _dedup_slug(_slugify(child.heading), used_slugs)
         if child.children:
-            sub = write_tree(child, output_dir / slug)
+            sub = yield from _plan_tree(child, output_dir / slug, source)
             written.append(_Written(slug, child.heading, is_dir=True, children=sub))
         else:
-            lines = [f"# {child.heading}"]
-            body = _strip_blank_edges(child.content)
+            lines: list[str | Span] = [f"# {child.heading}"]
+            body = _strip_blank_edges(child.content, source)
             if body:
                 lines.append("")
                 lines.extend(body)
-            (output_dir / f"{slug}.md").write_text("\n".join(lines) + "\n")
+            yield output_dir / f"{slug}.md", lines
             written.append(_Written(slug, child.heading, is_dir=False))
 
-    content = _strip_blank_edges(section.content)
-    index_lines: list[str] = []
+    content = _strip_blank_edges(section.content, source)
+    index_lines: list[str | Span] = []
     if section.heading:
         index_lines.append(f"# {section.heading}")
     elif written:
@@ -299,11 +801,299 @@ def write_tree(section: Section, output_dir: Path) -> list[_Written]:
             index_lines.append("")
         index_lines.extend(_format_index(written, "", 0))
     if index_lines:
-        (output_dir / "index.md").write_text("\n".join(index_lines) + "\n")
+        yield output_dir / "index.md", index_lines
+
+    return written
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Files queued per writer thread: enough to keep them all busy, few enough
+# that memory stays proportional to the files in flight, not the whole tree.
+_QUEUED_PER_WORKER = 4
+
+
+def _emit(
+    planned: Iterable[_Planned],
+    jobs: int | None,
+    write: Callable[[Path, list[str | Span]], R],
+) -> Iterator[R]:
+    """Create the planned directories and pass each planned file to *write*,
+    yielding its results in order.
+
+    Both go through a thread pool since the cost is mostly syscall latency
+    (slow metadata on network home dirs); every path is distinct, so the
+    result is the same as doing them one at a time. Only a few files per
+    thread are queued at once, so *planned* is consumed as fast as they're
+    written. A file waits for its directory, which was queued ahead of it."""
+    if jobs == 1:
+        for path, lines in planned:
+            if lines is None:
+                path.mkdir(parents=True, exist_ok=True)
+            else:
+                yield write(path, lines)
+        return
+
+    def write_in(made: Future[None], path: Path, lines: list[str | Span]) -> R:
+        made.result()
+        return write(path, lines)
+
+    # ThreadPoolExecutor's default when jobs is None.
+    workers = jobs or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # mkdir(parents=True, exist_ok=True) tolerates a racing parent mkdir.
+        dirs: dict[Path, Future[None]] = {}
+        queued: deque[Future[R]] = deque()
+        for path, lines in planned:
+            if lines is None:
+                dirs[path] = pool.submit(path.mkdir, parents=True, exist_ok=True)
+                continue
+            if len(queued) >= workers * _QUEUED_PER_WORKER:
+                yield queued.popleft().result()
+            made = dirs[path.parent]
+            if path.name == "index.md":
+                del dirs[path.parent]  # the last file planned in its directory
+            queued.append(pool.submit(write_in, made, path, lines))
+        while queued:
+            yield queued.popleft().result()
+        for made in dirs.values():
+            made.result()
+
+
+def write_tree(
+    section: Section,
+    output_dir: Path,
+    source: Source | None = None,
+    jobs: int | None = None,
+) -> list[_Written]:
+    """Write the section tree to disk. Each directory gets an index.md
+    containing its heading, preamble, and a nested TOC of descendants, and
+    *output_dir* gets a manifest of everything written (see update_tree).
 
+    *source* is the mapped file that Span content refers to (see
+    parse_markdown_stream). Up to *jobs* files are written concurrently
+    (default: ThreadPoolExecutor's default; 1 writes serially)."""
+    written: list[_Written] = []
+
+    def planned() -> Iterator[_Planned]:
+        written.extend((yield from _plan_tree(section, output_dir, source)))
+
+    def write(path: Path, lines: list[str | Span]) -> tuple[str, str]:
+        buffers = _render(lines, source)
+        _write_buffers(path, buffers)
+        return path.relative_to(output_dir).as_posix(), _digest(buffers)
+
+    _write_manifest(output_dir, dict(_emit(planned(), jobs, write)))
     return written
 
 
+# Records what the last split emitted: {relative path: sha256}. It also marks
+# the files as split output, so batch mode doesn't take them for input.
+MANIFEST_NAME = ".md-split.json"
+
+
+@dataclass
+class _UpdateStats:
+    written: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def _read_manifest(output_dir: Path) -> dict[str, str]:
+    try:
+        data = json.loads((output_dir / MANIFEST_NAME).read_text())
+        return dict(data["files"])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        return {}
+
+
+def _write_manifest(output_dir: Path, files: dict[str, str]) -> None:
+    tmp = output_dir / f"{MANIFEST_NAME}.tmp"
+    tmp.write_text(json.dumps({"files": files}, sort_keys=True) + "\n")
+    tmp.replace(output_dir / MANIFEST_NAME)
+
+
+def _digest(buffers: list[bytes | memoryview]) -> str:
+    digest = hashlib.sha256()
+    for buf in buffers:
+        digest.update(buf)
+    return digest.hexdigest()
+
+
+def update_tree(
+    section: Section,
+    output_dir: Path,
+    source: Source | None = None,
+    jobs: int | None = None,
+) -> _UpdateStats:
+    """Like write_tree, but only touch what changed since the last run.
+
+    The manifest of content hashes in *output_dir* records what was emitted
+    last time. Files whose rendered content still matches (and that are
+    still on disk) are left alone, keeping their mtimes; files whose sections
+    disappeared are deleted, along with any directories that leaves empty.
+    Files not listed in the manifest are never deleted.
+    """
+    previous = _read_manifest(output_dir)
+    live_dirs: set[Path] = set()
+
+    def planned() -> Iterator[_Planned]:
+        for path, lines in _plan_tree(section, output_dir, source):
+            if lines is None:
+                live_dirs.add(path)
+            yield path, lines
+
+    def emit(path: Path, lines: list[str | Span]) -> tuple[str, str, bool]:
+        buffers = _render(lines, source)
+        digest = _digest(buffers)
+        rel = path.relative_to(output_dir).as_posix()
+        if previous.get(rel) == digest and path.is_file():
+            return rel, digest, False
+        _write_buffers(path, buffers)
+        return rel, digest, True
+
+    stats = _UpdateStats()
+    manifest: dict[str, str] = {}
+    for rel, digest, changed in _emit(planned(), jobs, emit):
+        manifest[rel] = digest
+        if changed:
+            stats.written += 1
+        else:
+            stats.unchanged += 1
+
+    stale_dirs: set[Path] = set()
+    for rel in previous.keys() - manifest.keys():
+        path = output_dir / rel
+        path.unlink(missing_ok=True)
+        stats.removed += 1
+        parent = path.parent
+        while parent not in live_dirs and output_dir in parent.parents:
+            stale_dirs.add(parent)
+            parent = parent.parent
+    # Deepest first, so children are gone before their parents.
+    for d in sorted(stale_dirs, key=lambda d: len(d.parts), reverse=True):
+        try:
+            d.rmdir()
+        except OSError:
+            pass  # not empty: holds files we didn't emit
+
+    _write_manifest(output_dir, manifest)
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Search index
+# ---------------------------------------------------------------------------
+
+# Written next to the root index.md by `md split --index`.
+INDEX_NAME = ".md-index.sqlite"
+
+TERM_RE = re.compile(r"\w{2,}")
+
+
+def write_index(
+    section: Section, output_dir: Path, source: Source | None = None
+) -> int:
+    """Build an inverted index (term -> file + line numbers) over the files
+    write_tree emits for *section*, for `md search`. Returns the number of
+    distinct terms.
+
+    The tree is re-planned rather than re-read from disk; planning is
+    deterministic, so paths match what was written."""
+    files: list[tuple[int, str, int]] = []
+    postings: dict[str, dict[int, list[int]]] = {}
+    planned = _plan_tree(section, output_dir, source)
+    file_lines = ((path, lines) for path, lines in planned if lines is not None)
+    for file_id, (path, lines) in enumerate(file_lines):
+        text = b"".join(_render(lines, source)).decode(errors="replace")
+        length = 0
+        for lineno, line in enumerate(text.splitlines(), 1):
+            for term in TERM_RE.findall(line.lower()):
+                length += 1
+                postings.setdefault(term, {}).setdefault(file_id, []).append(lineno)
+        files.append((file_id, path.relative_to(output_dir).as_posix(), length))
+
+    tmp = output_dir / f"{INDEX_NAME}.tmp"
+    tmp.unlink(missing_ok=True)
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript(
+            """
+            CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT, length INTEGER);
+            CREATE TABLE postings (
+                term TEXT, file INTEGER, lines TEXT, PRIMARY KEY (term, file)
+            ) WITHOUT ROWID;
+            """
+        )
+        con.executemany("INSERT INTO files VALUES (?, ?, ?)", files)
+        con.executemany(
+            "INSERT INTO postings VALUES (?, ?, ?)",
+            (
+                (term, file_id, " ".join(map(str, lines)))
+                for term, by_file in postings.items()
+                for file_id, lines in by_file.items()
+            ),
+        )
+        con.commit()
+    finally:
+        con.close()
+    tmp.replace(output_dir / INDEX_NAME)
+    return len(postings)
+
+
+@dataclass
+class _Hit:
+    path: str
+    score: float
+    lines: list[int]
+
+
+def search_index(index_dir: Path, query: str, limit: int = 10) -> list[_Hit]:
+    """Rank the files indexed in *index_dir* against *query* with BM25.
+
+    Only the postings for the query's terms are read, so lookups stay fast
+    however large the tree is."""
+    terms = sorted(set(TERM_RE.findall(query.lower())))
+    if not terms:
+        return []
+    uri = (index_dir / INDEX_NAME).resolve().as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri=True)
+    try:
+        total, avg_length = con.execute(
+            "SELECT count(*), avg(length) FROM files"
+        ).fetchone()
+        placeholders = ",".join("?" * len(terms))
+        rows = con.execute(
+            f"SELECT p.term, f.path, f.length, p.lines FROM postings p "
+            f"JOIN files f ON f.id = p.file WHERE p.term IN ({placeholders})",
+            terms,
+        ).fetchall()
+    finally:
+        con.close()
+
+    doc_freq: dict[str, int] = {}
+    for term, *_ in rows:
+        doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    k1, b = 1.2, 0.75
+    hits: dict[str, _Hit] = {}
+    for term, path, length, lines in rows:
+        line_numbers = [int(n) for n in lines.split()]
+        tf = len(line_numbers)
+        df = doc_freq[term]
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        norm = tf + k1 * (1 - b + b * length / (avg_length or 1))
+        hit = hits.setdefault(path, _Hit(path, 0.0, []))
+        hit.score += idf * tf * (k1 + 1) / norm
+        hit.lines.extend(line_numbers)
+
+    ranked = sorted(hits.values(), key=lambda h: -h.score)[:limit]
+    for hit in ranked:
+        hit.lines = sorted(set(hit.lines))
+    return ranked
+
+
 # ---------------------------------------------------------------------------
 # Dry-run tree printer
 # ---------------------------------------------------------------------------
@@ -384,11 +1174,586 @@ HTML_TEMPLATE = """\
 """
 
 
-def render_html(text: str, title: str) -> str:
-    """Render markdown *text* to a full, styled HTML document."""
+# HTML_TEMPLATE with the style filled in once, split around title and body.
+_PAGE_START, _PAGE_TITLE_END, _PAGE_END = re.split(
+    r"\{title\}|\{body\}", HTML_TEMPLATE.replace("{style}", HTML_STYLE)
+)
+
+# Relative links to markdown files, e.g. `guide/index.md#setup`.
+MD_LINK_RE = re.compile(r"^(?![a-zA-Z][a-zA-Z0-9+.-]*:|/|#)([^?#]*)\.md(?=[?#]|$)")
+
+
+def _rewrite_md_links(state) -> None:
+    """Core rule: point relative links at *.md files to the rendered *.html,
+    so a rendered tree links to itself."""
+    for token in state.tokens:
+        for child in token.children or ():
+            if child.type == "link_open":
+                href = child.attrGet("href")
+                if href:
+                    child.attrSet("href", MD_LINK_RE.sub(r"\1.html", href))
+
+
+@functools.cache
+def _markdown_it(site: bool = False) -> MarkdownIt:
+    """The process-wide parser; building one (rules, linkify) isn't free."""
     md = MarkdownIt("gfm-like")
-    body = md.render(text)
-    return HTML_TEMPLATE.format(title=title, style=HTML_STYLE, body=body)
+    if site:
+        md.core.ruler.push("md_links", _rewrite_md_links)
+    return md
+
+
+def render_html(text: str, title: str, site: bool = False) -> str:
+    """Render markdown *text* to a full, styled HTML document.
+
+    With *site*, relative links to .md files are rewritten to .html."""
+    body = _markdown_it(site).render(text)
+    return "".join((_PAGE_START, title, _PAGE_TITLE_END, body, _PAGE_END))
+
+
+def _render_page(task: tuple[Path, Path, str]) -> None:
+    src, dst, title = task
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_text(render_html(src.read_text(), title, site=True))
+
+
+# Below this many files, worker startup costs more than it saves.
+_MIN_PARALLEL_PAGES = 64
+
+
+def render_site(src_dir: Path, out_dir: Path, jobs: int | None = None) -> int:
+    """Render every *.md under *src_dir* to a mirrored tree of .html files in
+    *out_dir* (e.g. the output of `md split`), with links between pages
+    rewritten to point at the HTML. Large trees are rendered in parallel
+    worker processes. Returns the number of pages written."""
+    tasks = []
+    for src in sorted(src_dir.rglob("*.md")):
+        rel = src.relative_to(src_dir)
+        page = rel.parent if rel.name == "index.md" else rel.with_suffix("")
+        title = page.as_posix() if page != Path(".") else src_dir.name
+        tasks.append((src, out_dir / rel.with_suffix(".html"), title))
+
+    if jobs == 1 or len(tasks) < _MIN_PARALLEL_PAGES:
+        for task in tasks:
+            _render_page(task)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(_render_page, tasks, chunksize=16))
+    return len(tasks)
+
+
+# ---------------------------------------------------------------------------
+# Render cache
+# ---------------------------------------------------------------------------
+
+CACHE_DIR = Path.home() / ".cache" / "md"
+# Least recently viewed pages are evicted once the cache grows past this.
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Bump whenever render_html's output changes for the same input.
+RENDER_VERSION = "1"
+
+
+def _cache_key(data: bytes, title: str) -> str:
+    h = hashlib.sha256()
+    for part in (RENDER_VERSION, MARKDOWN_IT_VERSION, HTML_STYLE, title):
+        h.update(part.encode())
+        h.update(b"\0")
+    h.update(data)
+    return h.hexdigest()
+
+
+def cached_render(data: bytes, title: str) -> Path:
+    """Return a rendered page for the markdown *data* from the cache in
+    CACHE_DIR, rendering and storing it first if needed. Pages are keyed by
+    content, so unchanged files are never re-parsed."""
+    path = CACHE_DIR / f"{_cache_key(data, title)}.html"
+    try:
+        os.utime(path)  # mark as recently used for eviction
+        return path
+    except FileNotFoundError:
+        pass
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(render_html(data.decode(), title))
+    tmp.replace(path)
+    _evict_cache(keep=path)
+    return path
+
+
+def _evict_cache(keep: Path) -> None:
+    """Delete least recently used pages until the cache fits CACHE_MAX_BYTES."""
+    pages: list[tuple[int, int, str]] = []
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.name.endswith(".html"):
+            continue
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        pages.append((st.st_mtime_ns, st.st_size, entry.path))
+        total += st.st_size
+
+    pages.sort()
+    for _, size, path in pages:
+        if total <= CACHE_MAX_BYTES:
+            break
+        if path == str(keep):
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+# ---------------------------------------------------------------------------
+# Live preview
+# ---------------------------------------------------------------------------
+
+# Heading and fence lines, found in one C-level scan over the whole text.
+# Same rules as HEADING_RE / _detect_code_fence, restricted to a single line.
+# Anchoring on a literal newline rather than ^ lets re skip ahead quickly.
+BLOCK_MARK_RE = re.compile(r"\n(?:(#{1,6})[^\S\n]+[^\n]+|[^\S\n]*(?:```|~~~))")
+# A line that might start a link reference definition (`[ref]: url`); only
+# blocks with one need parsing up front to collect them.
+REF_DEF_RE = re.compile(r"^ {0,3}\[[^\]\n]+\]:", re.M)
+# Bracketed text that might be a reference link's label.
+REF_LABEL_RE = re.compile(r"\[([^\]\n]+)\]")
+
+
+def _split_blocks(text: str) -> list[str]:
+    """Cut *text* at every heading outside code fences.
+
+    Each block is one node of the tree parse_markdown would build (its
+    heading line plus its own content), in document order. Blocks are
+    rendered independently, so an edit only re-renders the block it's in.
+    This deliberately skips building the tree itself, which is too slow to
+    redo on every save of a multi-MB file.
+    """
+    cuts = [0]
+    in_fence = False
+    # With a newline prepended, each match starts at the index in *text* of
+    # the line it found.
+    for m in BLOCK_MARK_RE.finditer("\n" + text):
+        if m.group(1) is None:
+            in_fence = not in_fence
+        elif not in_fence and m.start():
+            cuts.append(m.start())
+    cuts.append(len(text))
+    return [text[a:b] for a, b in zip(cuts, cuts[1:]) if a < b]
+
+
+class _LivePreview:
+    """Rendered blocks of one markdown file, kept current as it changes.
+
+    Blocks are keyed by content hash (plus an occurrence count for repeated
+    blocks), so the browser can keep the DOM for every block that didn't
+    change and only patch in the ones that did.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.order: list[str] = []
+        self.rendered: dict[str, str] = {}  # content hash -> HTML
+        self.definitions: dict[str, dict] = {}  # block -> its references
+        self.labels: dict[str, frozenset[str]] = {}  # block -> labels it may use
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def refresh(self) -> None:
+        try:
+            text = self.path.read_text()
+        except (FileNotFoundError, UnicodeDecodeError):
+            return  # caught mid-save; the next event will have the full file
+
+        md = _markdown_it()
+        blocks = _split_blocks(text)
+        # A reference link can be defined in any block, so gather every
+        # definition first and render each block with all of them. Blocks
+        # that didn't change keep the definitions parsed out of them before.
+        references: dict = {}
+        definitions: dict[str, dict] = {}
+        for block in blocks:
+            if not REF_DEF_RE.search(block):
+                continue
+            found = definitions.get(block)
+            if found is None:
+                found = self.definitions.get(block)
+            if found is None:
+                env: dict = {"references": {}}
+                md.parse(block, env)
+                found = env["references"]
+            definitions[block] = found
+            for label, target in found.items():
+                references.setdefault(label, target)  # the first one wins
+        self.definitions = definitions
+        env = {"references": references}
+
+        order: list[str] = []
+        rendered: dict[str, str] = {}
+        seen: dict[str, int] = {}
+        labels: dict[str, frozenset[str]] = {}
+        for block in blocks:
+            # A block's key covers the definitions it may use, so changing a
+            # URL only re-renders the blocks that link to it.
+            used = labels.get(block)
+            if used is None:
+                used = self.labels.get(block)
+            if used is None:
+                used = frozenset(
+                    normalizeReference(label) for label in REF_LABEL_RE.findall(block)
+                )
+            labels[block] = used
+            targets = json.dumps(
+                [
+                    (label, references[label])
+                    for label in sorted(used & references.keys())
+                ]
+            )
+            # Keys only need to be stable for the life of the server.
+            digest = format(hash((block, targets)) & 0xFFFFFFFFFFFFFFFF, "x")
+            if digest not in rendered:
+                rendered[digest] = self.rendered.get(digest) or md.render(block, env)
+            seen[digest] = n = seen.get(digest, 0) + 1
+            order.append(f"{digest}-{n}")
+        self.labels = labels
+
+        with self.changed:
+            if order == self.order:
+                return
+            self.order, self.rendered = order, rendered
+            self.version += 1
+            self.changed.notify_all()
+
+    def snapshot(self, version: int, timeout: float) -> tuple[int, list[str], dict]:
+        """Wait up to *timeout* for a version newer than *version*."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.order, self.rendered
+
+
+LIVE_SCRIPT = """\
+<div id="md"></div>
+<script>
+const root = document.getElementById("md");
+const nodes = new Map();
+new EventSource("/events").onmessage = (e) => {
+  const { order, html } = JSON.parse(e.data);
+  const keep = new Set(order);
+  for (const [key, el] of nodes) {
+    if (!keep.has(key)) { el.remove(); nodes.delete(key); }
+  }
+  let prev = null;
+  for (const key of order) {
+    let el = nodes.get(key);
+    if (!el) {
+      el = document.createElement("div");
+      el.innerHTML = html[key];
+      nodes.set(key, el);
+    }
+    const next = prev ? prev.nextSibling : root.firstChild;
+    if (el !== next) root.insertBefore(el, next);
+    prev = el;
+  }
+};
+</script>
+<style>#md > div { display: contents; }</style>
+"""
+
+
+def _make_handler(preview: _LivePreview) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path == "/":
+                page = render_html("", preview.path.name).replace(
+                    "</body>", LIVE_SCRIPT + "</body>"
+                )
+                body = page.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == "/events":
+                self._stream_events()
+            else:
+                self.send_error(404)
+
+        def _stream_events(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # Send each client only the blocks it doesn't already have.
+            known: set[str] = set()
+            version = -1
+            try:
+                while True:
+                    latest, order, rendered = preview.snapshot(version, timeout=15)
+                    if latest == version:
+                        self.wfile.write(b": keepalive\n\n")
+                    else:
+                        version = latest
+                        html = {
+                            key: rendered[key.rsplit("-", 1)[0]]
+                            for key in order
+                            if key not in known
+                        }
+                        known = set(order)
+                        data = json.dumps({"order": order, "html": html})
+                        self.wfile.write(f"data: {data}\n\n".encode())
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def _watch(path: Path) -> Iterator[None]:
+    """Yield whenever *path* may have changed.
+
+    Uses inotify on Linux (watching the directory, since editors often save
+    by renaming a new file over the old one) and falls back to polling the
+    mtime elsewhere."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError, TypeError):
+        fd = -1
+
+    if fd < 0:
+        last = None
+        while True:
+            try:
+                mtime = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime != last:
+                last = mtime
+                yield
+            time.sleep(0.05)
+
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x2, 0x8, 0x80, 0x100
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, str(path.parent.resolve()).encode(), mask) < 0:
+        raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+    name = path.name.encode()
+    header = struct.Struct("iIII")
+    while True:
+        data = os.read(fd, 64 * 1024)
+        hit = False
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = header.unpack_from(data, offset)
+            start = offset + header.size
+            hit |= data[start : start + length].rstrip(b"\0") == name
+            offset = start + length
+        if hit:
+            yield
+
+
+# ---------------------------------------------------------------------------
+# Benchmarking
+# ---------------------------------------------------------------------------
+
+
+def _synthetic_changelog(sections: int) -> str:
+    """A changelog-shaped document: H2 releases, each with H3 change types
+    and many tiny H4 entries, totalling roughly *sections* headings."""
+    lines = ["# Changelog", ""]
+    n = 0
+    release = 0
+    while n < sections:
+        release += 1
+        lines += [f"## v{release}.0.0", "", "Release notes.", ""]
+        n += 1
+        for kind in ("Added", "Fixed"):
+            lines += [f"### {kind}", ""]
+            n += 1
+            for i in range(8):
+                lines += [f"#### Entry {i}", "", f"- change {release}.{i}", ""]
+                n += 1
+    return "\n".join(lines)
+
+
+def _synthetic_deep(sections: int) -> str:
+    """Headings that keep descending H1 -> H6 and climbing back, so every
+    section sits in a long chain of ancestors."""
+    lines: list[str] = []
+    levels = [1, 2, 3, 4, 5, 6, 5, 4, 3, 2]
+    for i in range(sections):
+        level = levels[i % len(levels)]
+        lines += [f"{'#' * level} Level {level} node {i}", "", f"Body of {i}.", ""]
+    return "\n".join(lines)
+
+
+def _synthetic_wide(sections: int) -> str:
+    """One H1 with every other heading a sibling H2 beneath it."""
+    lines = ["# Reference", ""]
+    for i in range(sections):
+        lines += [f"## Function {i}", ""]
+        lines += [f"Description line {j} of function {i}." for j in range(12)]
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _synthetic_fences(sections: int) -> str:
+    """Few headings, each followed by a long code fence full of lines that
+    look like headings."""
+    lines = ["# Examples", ""]
+    for i in range(max(sections // 20, 1)):
+        lines += [f"## Example {i}", "", "```python"]
+        for j in range(200):
+            lines += [f"# step {j}", f"value_{j} = compute({i}, {j})"]
+        lines += ["```", ""]
+    return "\n".join(lines)
+
+
+def _synthetic_tiny(sections: int) -> str:
+    """Many one-line sections, nearly all of which collapse_small merges."""
+    lines = ["# Notes", ""]
+    for i in range(sections):
+        lines += [f"{'##' if i % 5 == 0 else '###'} Note {i}", f"note {i}"]
+    return "\n".join(lines)
+
+
+CORPORA: dict[str, Callable[[int], str]] = {
+    "changelog": _synthetic_changelog,
+    "deep": _synthetic_deep,
+    "wide": _synthetic_wide,
+    "fences": _synthetic_fences,
+    "tiny": _synthetic_tiny,
+}
+
+STAGES = ("parse", "collapse", "count", "write", "render", "rss")
+
+# How much peak RSS `md split --stream` may add for each byte a dry run of
+# the same document adds (over a 10x smaller one, so interpreter startup
+# cancels out), a dry run being just the parsed, collapsed tree: split should
+# stay a small multiple of its output tree. Writing through a bounded queue
+# comes to 1.3 to 2.8 (up to 3.3 for small trees); holding every file's lines
+# until the last one is written, 3.6 to 5.7.
+MAX_RSS_PER_TREE_BYTE = 3.5
+# Trees growing less than this many bytes aren't judged: interpreter and
+# allocator noise is too large a share of them.
+MIN_RSS_TREE_BYTES = 3_000_000
+
+# Timing differences under this many seconds are left unjudged: on a loaded
+# machine a stage of a few ms can easily take twice as long.
+NOISE_SECONDS = 0.02
+# Times the 10x smaller document is run, keeping each stage's best time.
+SMALL_RUNS = 3
+
+
+@dataclass
+class _StageResult:
+    seconds: float
+    peak_bytes: int | None = None
+    files_per_sec: float | None = None
+    # rss only: the peak RSS of a dry run.
+    tree_peak_bytes: int | None = None
+
+
+def _run_stages(
+    text: str,
+    min_lines: int,
+    skip: set[str],
+    engine: Engine = Engine.REGEX,
+    trace: bool = False,
+) -> dict[str, _StageResult]:
+    """Run the split/render pipeline on *text*, timing each stage. With
+    *trace*, also record each stage's peak traced allocation (tracemalloc
+    slows everything down, so those timings aren't comparable)."""
+    results: dict[str, _StageResult] = {}
+
+    def run(stage: str, fn: Callable[[], T]) -> T:
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        value = fn()
+        result = _StageResult(time.perf_counter() - t0)
+        if trace:
+            result.peak_bytes = tracemalloc.get_traced_memory()[1] - before
+        if stage not in skip:
+            results[stage] = result
+        return value
+
+    parse = parse_markdown_tokens if engine is Engine.TOKENS else parse_markdown
+    root = run("parse", lambda: parse(text))
+    run("collapse", lambda: collapse_small(root, min_lines))
+
+    def count() -> None:
+        # What the dry-run tree printer asks of every node.
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            node.line_count()
+            pending.extend(node.children)
+
+    run("count", count)
+
+    if "write" not in skip:
+        with tempfile.TemporaryDirectory() as tmp:
+            run("write", lambda: write_tree(root, Path(tmp)))
+            files = sum(len(names) for _, _, names in os.walk(tmp))
+            results["write"].files_per_sec = files / results["write"].seconds
+
+    if "render" not in skip:
+        run("render", lambda: render_html(text, "bench"))
+
+    if "rss" not in skip:
+        results["rss"] = _split_rss(text, min_lines)
+
+    return results
+
+
+# Runs a script (argv[1]) and prints its peak RSS in bytes to stderr. Linux
+# carries the spawning process's peak across exec into ru_maxrss, so there
+# read the new address space's own high-water mark.
+_PEAK_RSS_PROBE = """
+import resource, runpy, sys
+sys.argv = sys.argv[1:]
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+finally:
+    try:
+        with open("/proc/self/status") as f:
+            hwm = next(line for line in f if line.startswith("VmHWM:"))
+        peak = int(hwm.split()[1]) * 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak_rss={peak}", file=sys.stderr)
+"""
+
+
+def _split_rss(text: str, min_lines: int) -> _StageResult:
+    """Run `md split --stream` on *text* in a child process, and a dry run of
+    it, recording the peak RSS of each."""
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        doc = Path(tmp) / "bench.md"
+        doc.write_text(text)
+        argv = [sys.executable, "-c", _PEAK_RSS_PROBE, __file__, "split", str(doc)]
+        argv += ["-o", str(Path(tmp) / "out"), "--stream", "-m", str(min_lines)]
+        t0 = time.perf_counter()
+        for extra in ([], ["--dry-run"]):
+            proc = subprocess.run(
+                argv + extra,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            peaks.append(int(proc.stderr.rsplit("peak_rss=", 1)[1]))
+            if not extra:
+                seconds = time.perf_counter() - t0
+    return _StageResult(seconds, peaks[0], tree_peak_bytes=peaks[1])
 
 
 # ---------------------------------------------------------------------------
@@ -399,16 +1764,31 @@ def render_html(text: str, title: str) -> str:
 @app.command()
 def view(
     ctx: typer.Context,
-    file: Path = typer.Argument(None, help="Markdown file to view."),
+    file: Path = typer.Argument(
+        None, help="Markdown file, or a directory of them (e.g. `md split` output)."
+    ),
     output: Path = typer.Option(
         None,
         "-o",
         "--output",
-        help="Write the HTML to this path instead of a temp file.",
+        help="Write the HTML to this path instead of a temp file (a directory "
+        "when viewing a directory).",
     ),
     no_open: bool = typer.Option(
         False, "--no-open", help="Write the HTML without opening a browser."
     ),
+    jobs: int = typer.Option(
+        None,
+        "-j",
+        "--jobs",
+        min=1,
+        help="Worker processes for rendering a directory (default: CPU count).",
+    ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help=f"Render from scratch instead of reusing {CACHE_DIR}.",
+    ),
 ) -> None:
     """Render a markdown file to HTML and open it in a browser."""
     if file is None:
@@ -419,16 +1799,29 @@ def view(
         typer.echo(f"File not found: {file}", err=True)
         raise typer.Exit(1)
 
-    html = render_html(file.read_text(), title=file.name)
+    if file.is_dir():
+        out_dir = output or Path(tempfile.mkdtemp(prefix=f"{file.name}-"))
+        count = render_site(file, out_dir, jobs)
+        index = out_dir / "index.html"
+        if no_open or not index.exists():
+            typer.echo(f"Wrote {count} pages to {out_dir}/")
+        else:
+            webbrowser.open(index.resolve().as_uri())
+        return
 
-    if output is not None:
-        output.write_text(html)
+    if not no_cache:
+        out_path = cached_render(file.read_bytes(), title=file.name)
+        if output is not None:
+            shutil.copyfile(out_path, output)
+            out_path = output
+    elif output is not None:
+        output.write_text(render_html(file.read_text(), title=file.name))
         out_path = output
     else:
         fd, tmp = tempfile.mkstemp(suffix=".html", prefix=f"{file.stem}-")
         out_path = Path(tmp)
         with open(fd, "w") as f:
-            f.write(html)
+            f.write(render_html(file.read_text(), title=file.name))
 
     if no_open:
         typer.echo(f"Wrote {out_path}")
@@ -436,15 +1829,62 @@ def view(
         webbrowser.open(out_path.resolve().as_uri())
 
 
+@app.command()
+def serve(
+    ctx: typer.Context,
+    file: Path = typer.Argument(None, help="Markdown file to preview."),
+    port: int = typer.Option(0, "-p", "--port", help="Port (default: any free)."),
+    no_open: bool = typer.Option(
+        False, "--no-open", help="Print the URL without opening a browser."
+    ),
+) -> None:
+    """Serve a live-updating HTML preview of a markdown file.
+
+    The page patches itself over server-sent events as the file changes;
+    only the sections that changed are re-rendered and sent."""
+    if file is None:
+        typer.echo(ctx.get_help())
+        raise typer.Exit(0)
+
+    if not file.exists():
+        typer.echo(f"File not found: {file}", err=True)
+        raise typer.Exit(1)
+
+    preview = _LivePreview(file)
+    preview.refresh()
+
+    def watch() -> None:
+        for _ in _watch(file):
+            preview.refresh()
+
+    threading.Thread(target=watch, daemon=True).start()
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(preview))
+    server.daemon_threads = True
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    typer.echo(f"Serving {file} at {url}")
+    if not no_open:
+        webbrowser.open(url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 @app.command()
 def split(
     ctx: typer.Context,
-    file: Path = typer.Argument(None, help="Markdown file to split."),
+    files: list[Path] = typer.Argument(
+        None, help="Markdown files, directories or glob patterns to split."
+    ),
     output_dir: Path = typer.Option(
         None,
         "-o",
         "--output-dir",
-        help="Output directory (default: filename without extension).",
+        help="Output directory (default: filename without extension). With "
+        "several inputs, each one's tree goes under it at its relative path.",
     ),
     min_lines: int = typer.Option(
         10,
@@ -452,21 +1892,267 @@ def split(
         "--min-lines",
         help="Minimum lines for a leaf file; smaller sections get collapsed.",
     ),
+    min_bytes: int = typer.Option(
+        None,
+        "--min-bytes",
+        min=0,
+        help="Size files by bytes instead of lines: pack smaller sibling "
+        "sections together until they reach this (default: half of --max-bytes).",
+    ),
+    max_bytes: int = typer.Option(
+        None,
+        "--max-bytes",
+        min=1,
+        help="Split sections larger than this at paragraph or code block boundaries.",
+    ),
+    min_tokens: int = typer.Option(
+        None,
+        "--min-tokens",
+        min=0,
+        help=f"--min-bytes in approximate tokens ({BYTES_PER_TOKEN} bytes each).",
+    ),
+    max_tokens: int = typer.Option(
+        None,
+        "--max-tokens",
+        min=1,
+        help=f"--max-bytes in approximate tokens ({BYTES_PER_TOKEN} bytes each).",
+    ),
     dry_run: bool = typer.Option(
         False, "-n", "--dry-run", help="Print the resulting tree without writing files."
     ),
+    engine: Engine = typer.Option(
+        Engine.REGEX,
+        "-e",
+        "--engine",
+        help="Heading detection: a fast line regex, or markdown-it's CommonMark "
+        "parser (setext headings, indented code, nested fences).",
+    ),
+    stream: bool = typer.Option(
+        False,
+        "--stream",
+        help="Parse incrementally, keeping section bodies as offsets into the "
+        "file instead of in memory (for very large inputs; regex engine only).",
+    ),
+    jobs: int = typer.Option(
+        None,
+        "-j",
+        "--jobs",
+        min=1,
+        help="Files to write concurrently per input (default: based on CPU "
+        "count for a single input, 1 in batch mode).",
+    ),
+    processes: int = typer.Option(
+        None,
+        "-p",
+        "--processes",
+        min=1,
+        help="Inputs to split in parallel in batch mode (default: CPU count).",
+    ),
+    incremental: bool = typer.Option(
+        False,
+        "-i",
+        "--incremental",
+        help="Only rewrite files whose content changed since the last split, "
+        "and remove files for sections that are gone.",
+    ),
+    index: bool = typer.Option(
+        False,
+        "--index",
+        help=f"Also write a search index ({INDEX_NAME}) for `md search`.",
+    ),
 ) -> None:
-    """Split a markdown file into a directory tree of sub-files."""
-    if file is None:
+    """Split markdown files into directory trees of sub-files."""
+    if not files:
         typer.echo(ctx.get_help())
         raise typer.Exit(0)
 
-    if not file.exists():
-        typer.echo(f"File not found: {file}", err=True)
+    if stream and engine is not Engine.REGEX:
+        typer.echo("--stream only works with --engine regex", err=True)
+        raise typer.Exit(1)
+
+    if min_tokens is not None:
+        min_bytes = min_tokens * BYTES_PER_TOKEN
+    if max_tokens is not None:
+        max_bytes = max_tokens * BYTES_PER_TOKEN
+    if min_bytes is None and max_bytes is not None:
+        min_bytes = max_bytes // 2
+    if min_bytes is not None and max_bytes is not None and min_bytes > max_bytes:
+        typer.echo("The minimum size can't be larger than the maximum.", err=True)
+        raise typer.Exit(1)
+
+    def job(file: Path, out: Path, jobs: int | None) -> _SplitJob:
+        return _SplitJob(
+            file,
+            out,
+            min_lines,
+            min_bytes,
+            max_bytes,
+            engine,
+            stream,
+            jobs,
+            incremental,
+            index,
+        )
+
+    if len(files) == 1 and files[0].is_file():
+        file = files[0]
+        out = output_dir if output_dir is not None else file.with_suffix("")
+        if dry_run:
+            _print_split(job(file, out, jobs))
+            return
+        summary = _split_file(job(file, out, jobs))
+        typer.echo(f"Updated {out}/: {summary}" if summary else f"Wrote to {out}/")
+        return
+
+    inputs = _expand_inputs(files)
+    if not inputs:
+        missing = f"File not found: {files[0]}" if len(files) == 1 else None
+        typer.echo(missing or "No markdown files found.", err=True)
+        raise typer.Exit(1)
+
+    tasks = [
+        job(
+            file,
+            output_dir / rel if output_dir is not None else file.with_suffix(""),
+            jobs if jobs is not None else 1,
+        )
+        for file, rel in inputs
+    ]
+    kept = _skip_outputs(tasks)
+    if skipped := len(tasks) - len(kept):
+        typer.echo(
+            f"Skipping {skipped} file{'s' if skipped > 1 else ''} inside the "
+            "output of another input (e.g. from an earlier split).",
+            err=True,
+        )
+    tasks = kept
+    conflicts = _output_conflicts(tasks)
+    if conflicts:
+        for conflict in conflicts:
+            typer.echo(conflict, err=True)
+        typer.echo("Split them separately, or into different -o directories.", err=True)
         raise typer.Exit(1)
 
-    root = parse_markdown(file.read_text())
-    collapse_small(root, min_lines)
+    if dry_run:
+        for task in tasks:
+            typer.echo(f"==> {task.file} <==")
+            _print_split(task)
+        return
+
+    start = time.perf_counter()
+    busy = 0.0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for task, seconds, summary, error in pool.map(_split_task, tasks):
+            busy += seconds
+            if error:
+                failed += 1
+                typer.echo(f"{seconds:7.2f}s  {task.file}: {error}", err=True)
+            else:
+                typer.echo(
+                    f"{seconds:7.2f}s  {task.file} -> {task.output_dir}/  "
+                    f"{summary}".rstrip()
+                )
+    typer.echo(
+        f"Split {len(tasks) - failed}/{len(tasks)} files in "
+        f"{time.perf_counter() - start:.2f}s ({busy:.2f}s of work)"
+    )
+    if failed:
+        raise typer.Exit(1)
+
+
+def _expand_inputs(inputs: list[Path]) -> list[tuple[Path, Path]]:
+    """Resolve split inputs to (markdown file, output path relative to -o).
+
+    Directories contribute every *.md below them, keeping their layout;
+    paths that don't exist are tried as glob patterns (for when the shell
+    didn't expand them), keeping the layout below the pattern's first
+    wildcard."""
+    found: dict[Path, Path] = {}
+    for path in inputs:
+        if path.is_dir():
+            for file in sorted(path.rglob("*.md")):
+                found.setdefault(file, file.relative_to(path).with_suffix(""))
+        elif path.is_file():
+            found.setdefault(path, Path(path.stem))
+        else:
+            root = Path()
+            for part in path.parent.parts:
+                if glob.has_magic(part):
+                    break
+                root /= part
+            for match in sorted(glob.glob(str(path), recursive=True)):
+                file = Path(match)
+                if file.is_file():
+                    found.setdefault(file, file.relative_to(root).with_suffix(""))
+    return list(found.items())
+
+
+def _skip_outputs(tasks: list["_SplitJob"]) -> list["_SplitJob"]:
+    """Drop inputs that are split output: inside a tree this run writes, or
+    listed in the manifest an earlier split left in one of their parent
+    directories (so rerunning `md split docs/` doesn't split its own output)."""
+    outputs = {task.output_dir.resolve() for task in tasks}
+    manifests: dict[Path, dict[str, str]] = {}
+
+    def is_output(file: Path) -> bool:
+        for parent in file.parents:
+            if parent in outputs:
+                return True
+            if parent not in manifests:
+                manifests[parent] = _read_manifest(parent)
+            if file.relative_to(parent).as_posix() in manifests[parent]:
+                return True
+        return False
+
+    return [task for task in tasks if not is_output(task.file.resolve())]
+
+
+def _output_conflicts(tasks: list["_SplitJob"]) -> list[str]:
+    """Describe inputs that would be split into the same directory, which
+    batch mode would write concurrently. A tree nested in another's is
+    allowed: it's how `api.md` next to `api/intro.md` (as fetch-docs lays
+    them out) maps into -o."""
+    conflicts: list[str] = []
+    by_output: dict[Path, _SplitJob] = {}
+    for task in tasks:
+        other = by_output.setdefault(task.output_dir.resolve(), task)
+        if other is not task:
+            conflicts.append(
+                f"{other.file} and {task.file} would both be split into "
+                f"{task.output_dir}/"
+            )
+    return conflicts
+
+
+@dataclass(frozen=True)
+class _SplitJob:
+    """One input for split, with its options (picklable for batch mode)."""
+
+    file: Path
+    output_dir: Path
+    min_lines: int
+    # With either set, sections are sized by bytes and min_lines is ignored.
+    min_bytes: int | None
+    max_bytes: int | None
+    engine: Engine
+    stream: bool
+    jobs: int | None
+    incremental: bool
+    index: bool
+
+
+def _build_tree(job: _SplitJob, source: Source | None) -> Section:
+    if source is not None:
+        root = parse_markdown_stream(source)
+    elif job.engine is Engine.TOKENS:
+        root = parse_markdown_tokens(job.file.read_text())
+    else:
+        root = parse_markdown(job.file.read_text())
+    if job.min_bytes is not None or job.max_bytes is not None:
+        collapse_by_size(root, job.min_bytes or 0, job.max_bytes, source)
+    else:
+        collapse_small(root, job.min_lines)
 
     # If the document has a single wrapping heading (e.g. `# Guide` at the top
     # of guide.md), promote it so the output dir doesn't get a redundant
@@ -474,23 +2160,228 @@ def split(
     # into the promoted section's body.
     if not root.heading and len(root.children) == 1:
         only = root.children[0]
-        preamble = _strip_blank_edges(root.content)
+        preamble = _strip_blank_edges(root.content, source)
         if preamble:
             only.content = [*preamble, "", *only.content]
+            only._lines = None
         root = only
+    return root
 
-    if dry_run:
+
+def _print_split(job: _SplitJob) -> None:
+    with _mapped(job.file) if job.stream else nullcontext() as source:
+        root = _build_tree(job, source)
         if not root.children:
             typer.echo("(no sections to split)")
         else:
             _print_tree(root)
-        return
 
-    if output_dir is None:
-        output_dir = file.with_suffix("")
 
-    write_tree(root, output_dir)
-    typer.echo(f"Wrote to {output_dir}/")
+def _split_file(job: _SplitJob) -> str:
+    """Parse, collapse and write one file. Returns the incremental summary,
+    or "" for a full write."""
+    with _mapped(job.file) if job.stream else nullcontext() as source:
+        root = _build_tree(job, source)
+        summary = ""
+        if job.incremental:
+            stats = update_tree(root, job.output_dir, source, job.jobs)
+            summary = (
+                f"{stats.written} written, {stats.unchanged} unchanged, "
+                f"{stats.removed} removed"
+            )
+        else:
+            write_tree(root, job.output_dir, source, job.jobs)
+        if job.index:
+            write_index(root, job.output_dir, source)
+        return summary
+
+
+def _split_task(job: _SplitJob) -> tuple[_SplitJob, float, str, str | None]:
+    """Process-pool entry point for batch split; never raises so one bad
+    file doesn't abort the batch."""
+    start = time.perf_counter()
+    try:
+        summary = _split_file(job)
+        error = None
+    except Exception as e:
+        summary, error = "", f"{type(e).__name__}: {e}"
+    return job, time.perf_counter() - start, summary, error
+
+
+@app.command()
+def search(
+    ctx: typer.Context,
+    query: list[str] = typer.Argument(None, help="Terms to search for."),
+    directory: Path = typer.Option(
+        Path("."),
+        "-d",
+        "--dir",
+        help="A tree written by `md split --index`.",
+    ),
+    limit: int = typer.Option(10, "-n", "--limit", help="Results to show."),
+) -> None:
+    """Search a split tree's index, best matches first."""
+    if not query:
+        typer.echo(ctx.get_help())
+        raise typer.Exit(0)
+
+    if not (directory / INDEX_NAME).exists():
+        typer.echo(f"No index in {directory}/; run `md split --index` first.", err=True)
+        raise typer.Exit(1)
+
+    hits = search_index(directory, " ".join(query), limit)
+    if not hits:
+        raise typer.Exit(1)
+    for hit in hits:
+        path = directory / hit.path
+        try:
+            first = path.read_text().splitlines()[hit.lines[0] - 1].strip()
+        except (OSError, IndexError):
+            first = ""
+        more = f" (+{len(hit.lines) - 1} more)" if len(hit.lines) > 1 else ""
+        typer.echo(f"{path}:{hit.lines[0]}: {first}{more}")
+
+
+@app.command()
+def bench(
+    corpus: list[str] = typer.Option(
+        None,
+        "-c",
+        "--corpus",
+        help=f"Corpus to run, repeatable (default: all of {', '.join(CORPORA)}).",
+    ),
+    sections: int = typer.Option(
+        10_000, "-s", "--sections", help="Headings per synthetic document."
+    ),
+    min_lines: int = typer.Option(10, "-m", "--min-lines"),
+    engine: Engine = typer.Option(
+        Engine.REGEX, "-e", "--engine", help="Heading detection engine to parse with."
+    ),
+    skip: list[str] = typer.Option(
+        None, "--skip", help=f"Stage to skip, repeatable ({', '.join(STAGES)})."
+    ),
+    save: Path = typer.Option(None, "--save", help="Write the results as JSON."),
+    baseline: Path = typer.Option(
+        None, "-b", "--baseline", help="Compare against results saved by --save."
+    ),
+    threshold: float = typer.Option(
+        0.25,
+        "-t",
+        "--threshold",
+        help="Flag stages slower or using more memory than the baseline by "
+        "more than this fraction.",
+    ),
+    max_growth: float = typer.Option(
+        2.0,
+        "--max-growth",
+        help="Flag stages whose per-section time grows by more than this "
+        "factor from a document 10x smaller (i.e. superlinear).",
+    ),
+) -> None:
+    """Benchmark parse/collapse/write/render on synthetic documents.
+
+    Reports per-stage wall time, scaling against a 10x smaller document,
+    peak memory and files written per second, and the peak RSS of a real
+    `split --stream` (the rss stage), and exits non-zero if any stage is
+    superlinear or has regressed against --baseline, or if split's RSS
+    grows by more than MAX_RSS_PER_TREE_BYTE times its dry run's. Time
+    differences under NOISE_SECONDS aren't judged, and the smaller document
+    takes the best of SMALL_RUNS runs."""
+    names = corpus or list(CORPORA)
+    unknown = [n for n in names if n not in CORPORA]
+    if unknown:
+        typer.echo(f"Unknown corpus: {', '.join(unknown)}", err=True)
+        raise typer.Exit(1)
+    skipped = set(skip or ())
+
+    base: dict = {}
+    if baseline is not None:
+        saved = json.loads(baseline.read_text())
+        if saved.get("sections") != sections:
+            typer.echo(
+                f"warning: baseline was run with --sections {saved.get('sections')}",
+                err=True,
+            )
+        base = saved.get("results", {})
+
+    failed = False
+    report: dict[str, dict[str, dict]] = {}
+    for name in names:
+        text = CORPORA[name](sections)
+        small_text = CORPORA[name](sections // 10)
+        small = _run_stages(small_text, min_lines, skipped, engine)
+        for _ in range(SMALL_RUNS - 1):
+            again = _run_stages(small_text, min_lines, skipped | {"rss"}, engine)
+            for stage, result in again.items():
+                small[stage].seconds = min(small[stage].seconds, result.seconds)
+        timed = _run_stages(text, min_lines, skipped, engine)
+        tracemalloc.start()
+        try:
+            # rss measures a child process, so has nothing to trace.
+            traced = _run_stages(text, min_lines, skipped | {"rss"}, engine, trace=True)
+        finally:
+            tracemalloc.stop()
+
+        typer.echo(f"{name} ({sections} sections, {len(text) / 1e6:.1f} MB)")
+        typer.echo(
+            f"  {'stage':<10} {'time':>10} {'growth':>7} {'peak mem':>10} "
+            f"{'files/s':>9}  vs baseline"
+        )
+        report[name] = {}
+        for stage, result in timed.items():
+            if stage in traced:
+                result.peak_bytes = traced[stage].peak_bytes
+            report[name][stage] = asdict(result)
+
+            flags = []
+            t_small = small[stage].seconds
+            # Per-section cost ratio; ~1.0 when linear. Tiny stages are noisy,
+            # so only judge it when the extra time stands out from noise.
+            growth = (result.seconds / 10) / t_small if t_small > 0 else 1.0
+            excess = result.seconds - 10 * t_small * max_growth
+            if growth > max_growth and excess > NOISE_SECONDS:
+                flags.append("superlinear")
+            if stage == "rss":
+                tree = result.tree_peak_bytes - small[stage].tree_peak_bytes
+                # Like time, don't judge growth too small to stand out from noise.
+                if tree > MIN_RSS_TREE_BYTES:
+                    ratio = (result.peak_bytes - small[stage].peak_bytes) / tree
+                    if ratio > MAX_RSS_PER_TREE_BYTE:
+                        flags.append(f"{ratio:.1f}x the tree's RSS")
+
+            versus = ""
+            prev = base.get(name, {}).get(stage)
+            if prev:
+                change = result.seconds / prev["seconds"] - 1
+                versus = f"{change:+.0%}"
+                slower = result.seconds - prev["seconds"]
+                if change > threshold and slower > NOISE_SECONDS:
+                    flags.append("slower")
+                if prev.get("peak_bytes") and result.peak_bytes is not None:
+                    mem_change = result.peak_bytes / prev["peak_bytes"] - 1
+                    versus += f" time, {mem_change:+.0%} mem"
+                    if mem_change > threshold:
+                        flags.append("more memory")
+
+            rate = f"{result.files_per_sec:.0f}" if result.files_per_sec else ""
+            flag = f"  <-- {', '.join(flags)}" if flags else ""
+            failed |= bool(flags)
+            typer.echo(
+                f"  {stage:<10} {result.seconds * 1000:>8.1f}ms {growth:>6.2f}x "
+                f"{(result.peak_bytes or 0) / 1e6:>8.1f}MB {rate:>9}  {versus}{flag}"
+            )
+
+    if save is not None:
+        payload = {
+            "sections": sections,
+            "min_lines": min_lines,
+            "engine": engine.value,
+            "results": report,
+        }
+        save.write_text(json.dumps(payload, indent=2) + "\n")
+        typer.echo(f"Saved results to {save}")
+    if failed:
+        raise typer.Exit(1)
 
 
 if __name__ == "__main__":
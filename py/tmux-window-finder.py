@@ -7,29 +7,205 @@
 tmux-window-finder - Fuzzy find tmux windows by session + process label.
 
 Subcommands:
-  update  — query tmux + ps, resolve labels, write per-window JSON (runs on hooks)
-  lookup  — read state dir, output for fzf (runs on prefix+w)
+  update  — query tmux + ps, resolve labels, write the state file (runs on hooks)
+  lookup  — print the picker's view, output for fzf (runs on prefix+w)
   notify  — set/clear the AI status flag on a window (--on/--working/--off)
-
-State lives in ~/.local/state/tmux-window-finder/{window_id}.json
-(e.g. @5.json — tmux's stable window id, immune to renumbering / renames).
-Each file: { "session": "...", "window_index": "...", "label": "...", "status": null }
+  daemon  — keep the window table in memory, fed by tmux control mode
+  stats   — show how many updates ran vs. were coalesced, and recent latency
+  bench-procs, bench-lookup — (hidden) benchmarks
+  stress-notify — (hidden) check concurrent notifies don't lose updates
+
+When the daemon is running (see daemon.sock in the state dir), update and
+notify talk to it instead of doing the work themselves, and it sets the
+@window-finder-daemon option so the tmux config can skip the hooks whose
+changes it already sees in control mode.
+
+State lives in ~/.local/state/tmux-window-finder/state.json, keyed by tmux's
+stable window id (e.g. @5 — immune to renumbering / renames):
+  { "windows": { "@5": { "session": "...", "window_index": "...", "label": "...", "status": null } } }
 status is one of "notify" (\U0001f514), "working" (⌛), or null.
+
+It also holds the picker's order ("order": window ids, sorted) and each
+window's label as shown (its "display", numbered if the session has several
+of the same). Those change only with sessions, indexes and labels, so
+status changes reuse them. Every state write also writes view.tsv next to
+it: the picker's fzf lines, each ending in a tab and session:index.
+
+Tracing is opt-in: with TMUX_WINDOW_FINDER_TRACE=1 set, or a file named
+trace in the state dir (hooks don't see your shell's environment), each
+update, notify and daemon sync appends its timings per phase (tmux, ps, git,
+io, lock, daemon), its hook and any error to events.jsonl there, which is
+kept under EVENTS_MAX_BYTES. `stats` summarizes it.
 """
 
 from __future__ import annotations
 
-import json
 import os
-import subprocess
 import sys
-from pathlib import Path
 
-import typer
+# -- lookup fast path ---------------------------------------------------------
+# The picker runs `lookup` on prefix+w and on every reload. Answer it straight
+# from the view file before importing typer and the rest, which take longer
+# than the whole lookup, and without subprocess (~15ms to import).
+
+VIEW_PATH = os.path.expanduser("~/.local/state/tmux-window-finder/view.tsv")
+
+
+def _tmux_fast(*args: str) -> str:
+    """Run tmux and return its stdout, using only os."""
+    read_fd, write_fd = os.pipe()
+    try:
+        pid = os.posix_spawnp(
+            "tmux",
+            ["tmux", *args],
+            os.environ,
+            file_actions=[
+                (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+            ],
+        )
+    finally:
+        os.close(write_fd)
+    chunks = []
+    while chunk := os.read(read_fd, 65536):
+        chunks.append(chunk)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    return b"".join(chunks).decode().strip()
+
+
+def _print_view() -> bool:
+    """Print the view for fzf, and the active window's line number on stderr.
+    Returns False if there's no view yet."""
+    try:
+        with open(VIEW_PATH) as f:
+            view = f.read()
+    except OSError:
+        return False
+    if not view:
+        return True
+    # One tmux call for both, unlike separate session/window queries.
+    active = _tmux_fast("display-message", "-p", "#{session_name}:#{window_index}")
+    suffix = f"\t{active}"
+    active_line = 1
+    for n, line in enumerate(view.splitlines(), 1):
+        if line.endswith(suffix):
+            active_line = n
+            break
+    print(active_line, file=sys.stderr)
+    sys.stdout.write(view)
+    return True
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["lookup"] and _print_view():
+    sys.exit(0)
+
+
+# -- update fast path ---------------------------------------------------------
+# The pane-title-changed hook runs `update --hook NAME --window ID` every time
+# a shell prompt retitles a pane. With the daemon up, all that has to happen
+# is telling it which window to look at, so do that before importing typer,
+# which is most of what a full run costs.
+
+SOCKET_FILE = os.path.expanduser("~/.local/state/tmux-window-finder/daemon.sock")
+
+
+def _daemon_call(request: dict, timeout: float = 2.0) -> dict:
+    """Send *request* to the daemon and return its reply. Raises OSError
+    (FileNotFoundError or ConnectionRefusedError if no daemon is listening)
+    or ValueError for a garbled reply."""
+    import json
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(SOCKET_FILE)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while chunk := sock.recv(65536):
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks))
+
+
+def _forward_update(args: list[str]) -> bool:
+    """Queue a hook's update with the daemon, without waiting for it to sync.
+    Returns False if *args* need the full command or the daemon didn't take
+    the request."""
+    request: dict = {"op": "update", "windows": [], "wait": False}
+    if len(args) % 2:
+        return False
+    for option, value in zip(args[::2], args[1::2]):
+        if option == "--hook":
+            request["hook"] = value
+        elif option == "--window":
+            request["windows"].append(value)
+        else:
+            return False
+    try:
+        return "ok" in _daemon_call(request)
+    except (OSError, ValueError):
+        return False
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["update"]:
+    if _forward_update(sys.argv[2:]):
+        sys.exit(0)
+
+# The rest is only needed off the fast path.
+import abc  # noqa: E402
+import fcntl  # noqa: E402
+import json  # noqa: E402
+import math  # noqa: E402
+import random  # noqa: E402
+import socketserver  # noqa: E402
+import subprocess  # noqa: E402
+import tempfile  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from collections.abc import Callable, Iterable, Iterator  # noqa: E402
+from contextlib import contextmanager  # noqa: E402
+from dataclasses import asdict, dataclass  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+import typer  # noqa: E402
 
 app = typer.Typer(context_settings={"help_option_names": ["-h", "--help"]})
 
 STATE_DIR = Path.home() / ".local" / "state" / "tmux-window-finder"
+STATE_FILE = STATE_DIR / "state.json"
+# Held for every read-modify-write of the state file.
+STATE_LOCK = STATE_DIR / "state.lock"
+VIEW_FILE = Path(VIEW_PATH)
+SOCKET_PATH = Path(SOCKET_FILE)
+# Set while the daemon runs; see the hooks in dot-tmux.conf.
+DAEMON_OPTION = "@window-finder-daemon"
+COUNTERS_FILE = STATE_DIR / "counters.json"
+# Held by the one update waiting for its turn, and by the one running.
+UPDATE_QUEUE_LOCK = STATE_DIR / "update-queue.lock"
+UPDATE_RUN_LOCK = STATE_DIR / "update-run.lock"
+TRACE_ENV = "TMUX_WINDOW_FINDER_TRACE"
+TRACE_FLAG = STATE_DIR / "trace"
+EVENTS_FILE = STATE_DIR / "events.jsonl"
+# Past this the event log is cut to its newest half (roughly 1-2k events).
+EVENTS_MAX_BYTES = 512 * 1024
+
+# Seconds to wait after a change for more to arrive before acting on it, so a
+# burst (e.g. a shell retitling every pane) costs one update.
+DEBOUNCE = 0.05
+
+# One row per window: its id, where it lives, and what its active pane runs.
+WINDOW_FORMAT = "\t".join(
+    [
+        "#{window_id}",
+        "#{session_name}",
+        "#{window_index}",
+        "#{pane_current_command}",
+        "#{pane_pid}",
+        "#{pane_title}",
+        "#{pane_current_path}",
+    ]
+)
 
 AI_TOOLS = {"claude", "codex"}
 SHELLS = {"zsh", "bash", "fish"}
@@ -38,57 +214,276 @@ SHELLS = {"zsh", "bash", "fish"}
 STATUS_EMOJI = {"notify": "\U0001f514", "working": "⌛"}
 
 
-# -- helpers ------------------------------------------------------------------
+# -- tracing ------------------------------------------------------------------
 
+# The event being recorded by this thread, if tracing is on.
+_tracing = threading.local()
 
-def tmux(*args: str) -> str:
-    result = subprocess.run(["tmux", *args], capture_output=True, text=True, check=True)
-    return result.stdout.strip()
 
+def _trace_enabled() -> bool:
+    return bool(os.environ.get(TRACE_ENV)) or TRACE_FLAG.exists()
 
-def _build_children_map() -> dict[str, list[tuple[str, str]]]:
-    result = subprocess.run(
-        ["ps", "-e", "-o", "pid=,ppid=,comm="], capture_output=True, text=True
-    )
-    children: dict[str, list[tuple[str, str]]] = {}
-    for line in result.stdout.splitlines():
-        parts = line.split(None, 2)
-        if len(parts) < 3:
+
+@contextmanager
+def _traced(command: str, **fields: object) -> Iterator[dict]:
+    """Record this run of *command* in the event log: *fields*, anything the
+    block adds to the yielded dict, the time spent in each _phase, and the
+    error if it raised. A no-op (yielding a throwaway dict) unless tracing
+    is enabled, or if this thread is already recording."""
+    if getattr(_tracing, "event", None) is not None or not _trace_enabled():
+        yield {}
+        return
+    event = {"ts": round(time.time(), 3), "command": command, **fields, "phases": {}}
+    _tracing.event = event
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _tracing.event = None
+        event["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        event["phases"] = {k: round(v, 2) for k, v in event["phases"].items()}
+        try:
+            _append_event(event)
+        except OSError:
+            pass
+
+
+@contextmanager
+def _phase(name: str) -> Iterator[None]:
+    """Add the block's wall time to phase *name* of this thread's event."""
+    event = getattr(_tracing, "event", None)
+    if event is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = event["phases"]
+        phases[name] = phases.get(name, 0) + (time.perf_counter() - start) * 1000
+
+
+def _append_event(event: dict) -> None:
+    """Append *event* to the log, cutting the log to its newest half once it
+    outgrows EVENTS_MAX_BYTES."""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(EVENTS_FILE, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, json.dumps(event, separators=(",", ":")).encode() + b"\n")
+        size = os.lseek(fd, 0, os.SEEK_END)
+        if size > EVENTS_MAX_BYTES:
+            os.lseek(fd, size - EVENTS_MAX_BYTES // 2, os.SEEK_SET)
+            tail = os.read(fd, EVENTS_MAX_BYTES)
+            tail = tail[tail.index(b"\n") + 1 :]  # drop the partial first line
+            os.ftruncate(fd, 0)
+            os.write(fd, tail)
+    finally:
+        os.close(fd)
+
+
+def _read_events() -> list[dict]:
+    try:
+        with open(EVENTS_FILE) as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    events = []
+    for line in lines:
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError:
             continue
-        pid, ppid, comm = parts
-        cmd_name = comm.rsplit("/", 1)[-1]
-        children.setdefault(ppid, []).append((pid, cmd_name))
-    return children
+    return events
 
 
-def find_ai_tool(
-    pid: str, children_map: dict[str, list[tuple[str, str]]]
-) -> str | None:
-    for child_pid, cmd_name in children_map.get(pid, []):
-        if cmd_name in AI_TOOLS:
-            return cmd_name
-        found = find_ai_tool(child_pid, children_map)
-        if found:
-            return found
-    return None
+# -- helpers ------------------------------------------------------------------
 
 
-def _git_branch(path: str) -> str | None:
-    """Get the current git branch for a directory, or None."""
-    try:
+def tmux(*args: str) -> str:
+    with _phase("tmux"):
         result = subprocess.run(
-            ["git", "-C", path, "rev-parse", "--abbrev-ref", "HEAD"],
-            capture_output=True,
-            text=True,
-            timeout=2,
+            ["tmux", *args], capture_output=True, text=True, check=True
         )
-        if result.returncode == 0:
-            branch = result.stdout.strip()
-            if branch and branch != "HEAD":
+    return result.stdout.strip()
+
+
+class _ProcessTree(abc.ABC):
+    """Child processes by parent pid, as (pid, command name) pairs. Build a
+    fresh one per update; children and AI tool lookups are cached for its
+    lifetime."""
+
+    def __init__(self) -> None:
+        self._ai_tools: dict[str, str | None] = {}
+
+    @abc.abstractmethod
+    def children(self, pid: str) -> list[tuple[str, str]]:
+        """*pid*'s children, as (pid, command name) pairs."""
+
+    def ai_tool(self, pid: str) -> str | None:
+        """The first AI tool below *pid* in depth-first order.
+
+        Walks iteratively (process chains can be deep) in post-order, so each
+        pid's answer is built from its children's, and remembers the answer
+        for every pid visited: labeling all panes touches each process once.
+        """
+        memo = self._ai_tools
+        visiting: set[str] = set()
+        stack = [(pid, False)]
+        while stack:
+            current, expanded = stack.pop()
+            if current in memo:
+                continue
+            children = self.children(current)
+            if not expanded:
+                visiting.add(current)
+                stack.append((current, True))
+                # Children after the first AI tool can't change the answer.
+                for child, name in children:
+                    if name in AI_TOOLS:
+                        break
+                    if child not in memo and child not in visiting:
+                        stack.append((child, False))
+                continue
+            found = None
+            for child, name in children:
+                found = name if name in AI_TOOLS else memo.get(child)
+                if found:
+                    break
+            memo[current] = found
+        return memo[pid]
+
+
+class _PsTree(_ProcessTree):
+    """Every process on the box, from one `ps -e` snapshot (or its *output*)."""
+
+    def __init__(self, output: str | None = None) -> None:
+        if output is None:
+            output = subprocess.run(
+                ["ps", "-e", "-o", "pid=,ppid=,comm="], capture_output=True, text=True
+            ).stdout
+        super().__init__()
+        self._children: dict[str, list[tuple[str, str]]] = {}
+        for line in output.splitlines():
+            parts = line.split(None, 2)
+            if len(parts) < 3:
+                continue
+            pid, ppid, comm = parts
+            cmd_name = comm.rsplit("/", 1)[-1]
+            self._children.setdefault(ppid, []).append((pid, cmd_name))
+
+    def children(self, pid: str) -> list[tuple[str, str]]:
+        return self._children.get(pid, [])
+
+
+class _ProcTree(_ProcessTree):
+    """Linux: read only the processes asked about from /proc, rather than
+    every process on the box. A pid's children are listed per thread in
+    task/*/children (CONFIG_PROC_CHILDREN), and their names are in comm."""
+
+    def __init__(self, root: str = "/proc") -> None:
+        super().__init__()
+        self.root = root
+        self._children: dict[str, list[tuple[str, str]]] = {}
+
+    def children(self, pid: str) -> list[tuple[str, str]]:
+        cached = self._children.get(pid)
+        if cached is not None:
+            return cached
+        found: list[tuple[str, str]] = []
+        try:
+            tasks = os.listdir(f"{self.root}/{pid}/task")
+        except OSError:
+            tasks = []  # exited
+        for tid in tasks:
+            try:
+                with open(f"{self.root}/{pid}/task/{tid}/children") as f:
+                    child_pids = f.read().split()
+            except OSError:
+                continue
+            for child in child_pids:
+                try:
+                    with open(f"{self.root}/{child}/comm") as f:
+                        found.append((child, f.read().rstrip("\n")))
+                except OSError:
+                    continue
+        self._children[pid] = found
+        return found
+
+
+def _process_tree() -> _ProcessTree:
+    """The cheapest process tree available on this platform."""
+    if os.path.exists(f"/proc/self/task/{os.getpid()}/children"):
+        return _ProcTree()
+    with _phase("ps"):
+        return _PsTree()
+
+
+def find_ai_tool(pid: str, procs: _ProcessTree) -> str | None:
+    return procs.ai_tool(pid)
+
+
+# Pane path -> (its repo's HEAD file, (inode, mtime) of HEAD when read, branch).
+# Git replaces HEAD by renaming a new file over it, so either changes when the
+# branch does.
+_branch_cache: dict[str, tuple[str, tuple[int, int], str | None]] = {}
+
+
+def _find_head(path: str) -> str | None:
+    """The HEAD file of the repo containing *path*, following a `.git` file's
+    `gitdir:` line for worktrees and submodules."""
+    current = os.path.abspath(path)
+    while True:
+        dotgit = os.path.join(current, ".git")
+        if os.path.isdir(dotgit):
+            return os.path.join(dotgit, "HEAD")
+        if os.path.isfile(dotgit):
+            try:
+                with open(dotgit) as f:
+                    line = f.readline().strip()
+            except OSError:
+                return None
+            if not line.startswith("gitdir:"):
+                return None
+            # Relative gitdirs are relative to the .git file's directory.
+            gitdir = os.path.join(current, line.removeprefix("gitdir:").strip())
+            return os.path.join(gitdir, "HEAD")
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _git_branch(path: str) -> str | None:
+    """Get the current git branch for a directory, or None (not in a repo, or
+    a detached HEAD). Reads HEAD directly, and once cached only stats it."""
+    cached = _branch_cache.get(path)
+    if cached is not None:
+        head, key, branch = cached
+        try:
+            st = os.stat(head)
+            if (st.st_ino, st.st_mtime_ns) == key:
                 return branch
-    except (subprocess.TimeoutExpired, OSError):
-        pass
-    return None
+        except OSError:
+            pass
+    head = _find_head(path)
+    if head is None:
+        return None
+    try:
+        st = os.stat(head)
+        with open(head) as f:
+            content = f.read().strip()
+    except OSError:
+        return None
+    branch = None
+    if content.startswith("ref:"):
+        branch = content.removeprefix("ref:").strip().removeprefix("refs/heads/")
+    _branch_cache[path] = (head, (st.st_ino, st.st_mtime_ns), branch or None)
+    return branch or None
 
 
 def _extract_shell_title(pane_title: str) -> str | None:
@@ -105,11 +500,13 @@ def get_process_label(
     pane_pid: str,
     pane_title: str,
     pane_path: str,
-    children_map: dict[str, list[tuple[str, str]]],
+    procs: _ProcessTree,
 ) -> str:
-    ai_tool = find_ai_tool(pane_pid, children_map)
+    with _phase("ps"):
+        ai_tool = find_ai_tool(pane_pid, procs)
     if ai_tool:
-        branch = _git_branch(pane_path) if pane_path else None
+        with _phase("git"):
+            branch = _git_branch(pane_path) if pane_path else None
         if branch:
             return f"{ai_tool}: {branch}"
         return ai_tool
@@ -134,167 +531,349 @@ def _read_window_json(path: Path) -> dict:
         return {}
 
 
-def _atomic_write_json(path: Path, data: dict) -> None:
+def _atomic_write(path: Path, text: str) -> None:
+    """Write via a temp file unique to this writer, renamed into place, so
+    readers never see a partial file and writers never share a temp file."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(data) + "\n")
-    tmp.rename(path)
-
-
-# -- update -------------------------------------------------------------------
-
-
-@app.command()
-def update() -> None:
-    """Query tmux + ps, resolve process labels, write per-window state."""
-    try:
-        _do_update()
-    except Exception:
-        pass  # hooks must never return non-zero
+    with _phase("io"):
+        fd, tmp = tempfile.mkstemp(
+            dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
 
 
-def _prune_stale_files(live_files: set[Path]) -> None:
-    """Remove window files (and legacy session dirs) that no longer correspond to live tmux windows."""
+def _atomic_write_json(path: Path, data: dict) -> None:
+    _atomic_write(path, json.dumps(data, separators=(",", ":")) + "\n")
+
+
+@contextmanager
+def _locked_state() -> Iterator[dict]:
+    """Load the state for a read-modify-write, holding an exclusive flock
+    until the block exits, so notify, update and the daemon take turns
+    instead of overwriting each other's changes. Save with _save_state inside
+    the block; keep slow work (tmux, ps, git) outside it."""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(STATE_LOCK, "w") as lock:
+        with _phase("lock"):
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield _load_state()
+
+
+def _load_state() -> dict:
+    """Read the state (every window's record under "windows"), migrating the
+    old layout on first use."""
+    if not STATE_FILE.exists():
+        return _migrate_window_files()
+    with _phase("io"):
+        state = _read_window_json(STATE_FILE)
+    state.setdefault("windows", {})
+    return state
+
+
+def _save_state(state: dict, relabel: bool = True) -> None:
+    """Write the state and the picker's view. Only changes to sessions,
+    indexes or labels need *relabel*; without it, the stored order and
+    display labels are reused (unless windows came or went)."""
+    if relabel or set(state.get("order", ())) != state["windows"].keys():
+        _index_view(state)
+    _atomic_write_json(STATE_FILE, state)
+    _write_view(state)
+
+
+def _migrate_window_files() -> dict:
+    """Fold the older per-window {window_id}.json files into the state file
+    (and drop the even older <session>/<window>.json dirs, which flat keying
+    made obsolete)."""
+    state: dict = {"windows": {}}
     if not STATE_DIR.exists():
-        return
+        return state
+    windows = state["windows"]
+    legacy: list[Path] = []
     for entry in STATE_DIR.iterdir():
         if entry.is_dir():
-            # Legacy <session>/<window>.json layout — flat keying makes this obsolete.
             for child in entry.iterdir():
                 if child.is_file():
                     child.unlink()
             entry.rmdir()
-            continue
-        if entry.suffix == ".json" and entry not in live_files:
-            entry.unlink()
+        elif entry.suffix == ".json" and entry.stem.startswith("@"):
+            windows[entry.stem] = _read_window_json(entry)
+            legacy.append(entry)
+    if windows:
+        _save_state(state)
+    for path in legacy:
+        path.unlink()
+    return state
+
+
+def _set_window(
+    windows: dict[str, dict],
+    window_id: str,
+    session: str,
+    window_index: str,
+    label: str,
+) -> bool:
+    """Store a window's location and label, keeping its status flag. Returns
+    whether anything changed."""
+    record = windows.setdefault(window_id, {})
+    if (
+        record.get("session") == session
+        and record.get("window_index") == window_index
+        and record.get("label") == label
+        and "status" in record
+    ):
+        return False
+    record["session"] = session
+    record["window_index"] = window_index
+    record["label"] = label
+    record.setdefault("status", None)
+    return True
+
+
+def _daemon_request(request: dict, timeout: float = 2.0) -> dict | None:
+    """Send *request* to the daemon and return its reply, or None if it isn't
+    running (or doesn't answer in time), so callers can fall back."""
+    try:
+        return _daemon_call(request, timeout)
+    except (OSError, ValueError):
+        return None
+
+
+# -- update -------------------------------------------------------------------
+
+
+@app.command()
+def update(
+    debounce: float = typer.Option(
+        DEBOUNCE,
+        "--debounce",
+        help="Seconds to wait for more updates to coalesce with before running.",
+    ),
+    wait: bool = typer.Option(
+        False,
+        "--wait",
+        help="Always run (after any update in flight) instead of leaving the "
+        "work to one already queued, so the state is current on return.",
+    ),
+    show_stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Print how many windows were scanned, changed and pruned.",
+    ),
+    hook: str | None = typer.Option(
+        None, "--hook", help="The tmux hook that ran this, for the event log."
+    ),
+    windows: list[str] = typer.Option(
+        [],
+        "--window",
+        help="Window id (e.g. @5) to relabel even if its active pane looks "
+        "unchanged. Repeatable.",
+    ),
+) -> None:
+    """Query tmux + ps, resolve process labels, write window state.
+
+    Hooks fire in bursts, so concurrent updates coalesce: at most one runs and
+    one waits behind it, and the rest exit straight away since the waiting one
+    will see their changes too. With the daemon up, it does the coalescing."""
+    try:
+        with _traced("update", hook=hook) as event:
+            result = _coalesced_update(debounce, wait, windows)
+            event["coalesced"] = result is None
+            if result is not None:
+                event.update(asdict(result))
+        if show_stats:
+            if result is None:
+                typer.echo("coalesced into a queued update")
+            else:
+                typer.echo(
+                    f"{result.scanned} scanned, {result.changed} changed, "
+                    f"{result.pruned} pruned"
+                )
+    except Exception:
+        pass  # hooks must never return non-zero
 
 
-def _do_update() -> None:
+@dataclass
+class _UpdateStats:
+    scanned: int = 0
+    changed: int = 0
+    pruned: int = 0
+
+
+def _coalesced_update(
+    debounce: float, wait: bool, windows: Iterable[str] = ()
+) -> _UpdateStats | None:
+    """Run an update, or return None if it was left to one already queued."""
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    reply = None
+    with _phase("daemon"):
+        try:
+            reply = _daemon_call({"op": "update", "windows": list(windows)})
+        except (FileNotFoundError, ConnectionRefusedError):
+            # Nothing listening: if a daemon died without cleaning up, don't
+            # let its option keep the hooks off.
+            subprocess.run(
+                ["tmux", "set-option", "-gu", DAEMON_OPTION], capture_output=True
+            )
+        except (OSError, ValueError):
+            pass  # alive but not answering in time; its option stays
+    if reply is not None and "stats" in reply:
+        _bump_counters(runs=1)
+        return _UpdateStats(**reply["stats"])
+    with open(UPDATE_QUEUE_LOCK, "w") as queue, open(UPDATE_RUN_LOCK, "w") as run:
+        if not wait:
+            try:
+                fcntl.flock(queue, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # The queued update hasn't looked at tmux yet, so it covers us.
+                _bump_counters(coalesced=1)
+                return None
+            time.sleep(debounce)
+        with _phase("lock"):
+            fcntl.flock(run, fcntl.LOCK_EX)
+        # Changes from here on need another run, so let the next one queue.
+        fcntl.flock(queue, fcntl.LOCK_UN)
+        _bump_counters(runs=1)
+        return _do_update()
+
+
+def _bump_counters(**deltas: int) -> None:
+    """Add *deltas* to the counters shown by `stats`."""
+    fd = os.open(COUNTERS_FILE, os.O_RDWR | os.O_CREAT, 0o644)
     try:
-        raw = tmux(
-            "list-windows",
-            "-a",
-            "-F",
-            "#{window_id}\t#{session_name}\t#{window_index}\t#{pane_current_command}\t#{pane_pid}\t#{pane_title}\t#{pane_current_path}",
-        )
+        with _phase("lock"):
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            counters = json.loads(os.read(fd, 65536) or b"{}")
+        except json.JSONDecodeError:
+            counters = {}
+        for name, delta in deltas.items():
+            counters[name] = counters.get(name, 0) + delta
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, json.dumps(counters).encode())
+    finally:
+        os.close(fd)
+
+
+def _do_update() -> _UpdateStats:
+    stats = _UpdateStats()
+    try:
+        raw = tmux("list-windows", "-a", "-F", WINDOW_FORMAT)
     except subprocess.CalledProcessError:
-        return
+        return stats
     if not raw:
-        return
-
-    children_map = _build_children_map()
-    live_files: set[Path] = set()
+        return stats
 
+    procs = _process_tree()
+    rows: list[tuple[str, str, str, str]] = []
     for line in raw.splitlines():
         window_id, session, idx, cmd, pane_pid, pane_title, pane_path = line.split(
             "\t", 6
         )
-        label = get_process_label(cmd, pane_pid, pane_title, pane_path, children_map)
-
-        path = STATE_DIR / f"{window_id}.json"
-        existing = _read_window_json(path)
-        existing["session"] = session
-        existing["window_index"] = idx
-        existing["label"] = label
-        existing.setdefault("status", None)
-        _atomic_write_json(path, existing)
-        live_files.add(path)
-
-    _prune_stale_files(live_files)
+        label = get_process_label(cmd, pane_pid, pane_title, pane_path, procs)
+        rows.append((window_id, session, idx, label))
+
+    with _locked_state() as state:
+        previous = state["windows"]
+        # Windows tmux no longer lists are dropped by starting from scratch.
+        windows: dict[str, dict] = {}
+        for window_id, session, idx, label in rows:
+            windows[window_id] = previous.get(window_id, {})
+            stats.scanned += 1
+            stats.changed += _set_window(windows, window_id, session, idx, label)
+
+        stats.pruned = len(previous.keys() - windows.keys())
+        # Most hooks change nothing we show, so skip the rewrite when possible.
+        if stats.changed or stats.pruned:
+            state["windows"] = windows
+            _save_state(state)
+    return stats
 
 
 # -- lookup -------------------------------------------------------------------
 
 
-def _read_entries() -> list[tuple[str, str, str, str | None]]:
-    """Read all window entries from the state directory."""
-    entries: list[tuple[str, str, str, str | None]] = []
-    for window_file in sorted(STATE_DIR.iterdir()):
-        if not window_file.is_file() or window_file.suffix != ".json":
-            continue
-        data = _read_window_json(window_file)
-        session = data.get("session")
-        window_index = data.get("window_index")
-        if session is None or window_index is None:
-            continue
-        entries.append(
-            (
-                session,
-                window_index,
-                data.get("label", "?"),
-                data.get("status"),
-            )
-        )
-    return entries
+_AI_PREFIXES = tuple(AI_TOOLS)
+
 
+def _index_view(state: dict) -> None:
+    """Sort windows for the picker (by session, then AI tools first, then
+    label) and number duplicate labels within a session, storing the order
+    and each window's display label in *state*."""
+    windows = state["windows"]
+    order = [
+        window_id
+        for window_id, record in sorted(windows.items())
+        if record.get("session") is not None and record.get("window_index") is not None
+    ]
 
-def _sort_entries(entries: list[tuple[str, str, str, str | None]]) -> None:
-    """Sort entries by session, then AI tools first, then label."""
-    entries.sort(
-        key=lambda e: (
-            session_display(e[0]).lower(),
-            0 if any(e[2].startswith(t) for t in AI_TOOLS) else 1,
-            e[2].lower(),
+    def sort_key(window_id: str) -> tuple[str, int, str]:
+        record = windows[window_id]
+        label = record.get("label", "?")
+        return (
+            session_display(record["session"]).lower(),
+            0 if label.startswith(_AI_PREFIXES) else 1,
+            label.lower(),
         )
-    )
 
+    order.sort(key=sort_key)
 
-def _format_lines(
-    entries: list[tuple[str, str, str, str | None]],
-    active_session: str,
-    active_window: str,
-) -> tuple[list[str], int]:
-    """Build display lines with deduplicated labels. Returns (lines, active_line)."""
     label_counts: dict[tuple[str, str], int] = {}
-    for session, _, label, _ in entries:
-        key = (session, label)
+    for window_id in order:
+        record = windows[window_id]
+        key = (record["session"], record.get("label", "?"))
         label_counts[key] = label_counts.get(key, 0) + 1
 
     label_counters: dict[tuple[str, str], int] = {}
-    lines: list[str] = []
-    active_line = 1
-    for session, idx, label, status in entries:
-        key = (session, label)
+    for window_id in order:
+        record = windows[window_id]
+        label = record.get("label", "?")
+        key = (record["session"], label)
         if label_counts[key] > 1:
             n = label_counters.get(key, 0) + 1
             label_counters[key] = n
-            display_label = f"{label}-{n}"
-        else:
-            display_label = label
-
-        emoji = STATUS_EMOJI.get(status)
+            label = f"{label}-{n}"
+        record["display"] = label
+    state["order"] = order
+
+
+def _write_view(state: dict) -> None:
+    """Write the picker's lines for lookup (and the fzf script) to print."""
+    windows = state["windows"]
+    lines = []
+    for window_id in state["order"]:
+        record = windows[window_id]
+        session = record["session"]
+        display_label = record["display"]
+        emoji = STATUS_EMOJI.get(record.get("status"))
         if emoji:
             display_label = f"{emoji} {display_label}"
-
-        lines.append(f"{session_display(session)} {display_label}\t{session}:{idx}")
-        if session == active_session and idx == active_window:
-            active_line = len(lines)
-
-    return lines, active_line
+        lines.append(
+            f"{session_display(session)} {display_label}\t"
+            f"{session}:{record['window_index']}\n"
+        )
+    _atomic_write(VIEW_FILE, "".join(lines))
 
 
 @app.command()
 def lookup() -> None:
-    """Read state dir, output for fzf."""
-    if not STATE_DIR.exists():
-        _do_update()
-
-    entries = _read_entries()
-    if not entries:
-        return
+    """Print the picker's view, output for fzf.
 
-    active_session = tmux("display-message", "-p", "#{session_name}")
-    active_window = tmux("display-message", "-p", "#{window_index}")
-
-    _sort_entries(entries)
-    lines, active_line = _format_lines(entries, active_session, active_window)
-
-    if not lines:
-        return
-
-    print(active_line, file=sys.stderr)
-    for line in lines:
-        print(line)
+    Normally answered by the fast path at the top of this file; this only
+    runs to create the view the first time."""
+    with _traced("lookup"):
+        if not STATE_FILE.exists():
+            _do_update()
+        elif not VIEW_FILE.exists():
+            with _locked_state() as state:
+                _save_state(state)
+    _print_view()
 
 
 # -- notify -------------------------------------------------------------------
@@ -318,12 +897,37 @@ def notify(
     window: str | None = typer.Option(
         None, "--window", "-w", help="Target window index (auto-detected if omitted)"
     ),
+    targets: list[str] | None = typer.Argument(
+        None, help="More session:window targets, all updated in one write"
+    ),
+    stdin: bool = typer.Option(
+        False, "--stdin", help="Also read session:window targets from stdin"
+    ),
 ) -> None:
-    """Set or clear the AI status flag on a tmux window."""
+    """Set or clear the AI status flag on one or more tmux windows."""
     try:
-        _do_notify(
-            on=on, off=off, working=working, agent=agent, session=session, window=window
-        )
+        with _traced("notify", agent=agent) as event:
+            # Asked-for targets that all turned out empty or gone mean there's
+            # nothing to do, not "fall back to the current window".
+            explicit = stdin or bool(targets)
+            targets = list(targets or [])
+            if stdin:
+                targets += sys.stdin.read().split()
+            if session is not None and window is not None and explicit:
+                targets.append(f"{session}:{window}")
+            # With --stdin, stdin held the targets rather than hook JSON.
+            hook_input = {} if stdin else _read_stdin_hook_input()
+            event["hook"] = hook_input.get("hook_event_name")
+            _do_notify(
+                on=on,
+                off=off,
+                working=working,
+                agent=agent,
+                session=session,
+                window=window,
+                targets=targets if explicit else None,
+                hook_input=hook_input,
+            )
     except Exception:
         pass  # hooks must never return non-zero
 
@@ -341,6 +945,18 @@ def _read_stdin_hook_input() -> dict:
     return {}
 
 
+def _resolve_targets(targets: list[str]) -> list[tuple[str, str, str]]:
+    """Map session:window targets to (window_id, session, window_index) with a
+    single tmux call. Targets that no longer exist are dropped."""
+    by_target = {}
+    for line in tmux(
+        "list-windows", "-a", "-F", "#{window_id}\t#{session_name}\t#{window_index}"
+    ).splitlines():
+        window_id, session, window_index = line.split("\t", 2)
+        by_target[f"{session}:{window_index}"] = (window_id, session, window_index)
+    return [by_target[t] for t in dict.fromkeys(targets) if t in by_target]
+
+
 def _do_notify(
     *,
     on: bool,
@@ -349,6 +965,8 @@ def _do_notify(
     agent: str | None,
     session: str | None,
     window: str | None,
+    targets: list[str] | None,
+    hook_input: dict,
 ) -> None:
     if not on and not off and not working:
         typer.echo("Specify --on, --off, or --working", err=True)
@@ -357,36 +975,33 @@ def _do_notify(
     # on takes priority over working; off (or nothing-set fallthrough) clears.
     status = "notify" if on else "working" if working else None
 
-    # Resolve a stable window_id for the target. Priority:
-    #   1. explicit -s/-w (from the fzf bell-clear binding)
-    #   2. $TMUX_PANE (set when invoked from a hook in a pane)
-    #   3. the currently focused window
-    if session is not None and window is not None:
-        target_args = ["-t", f"{session}:{window}"]
-    elif pane_target := os.environ.get("TMUX_PANE"):
-        target_args = ["-t", pane_target]
+    # Resolve stable window_ids for the targets. Priority:
+    #   1. explicit targets (from the fzf bell-clear binding), even if none
+    #      are left
+    #   2. explicit -s/-w
+    #   3. $TMUX_PANE (set when invoked from a hook in a pane)
+    #   4. the currently focused window
+    if targets is not None:
+        resolved = _resolve_targets(targets) if targets else []
     else:
-        target_args = []
-
-    resolved = tmux(
-        "display-message",
-        *target_args,
-        "-p",
-        "#{window_id}\t#{session_name}\t#{window_index}",
-    )
-    window_id, session, window_index = resolved.split("\t", 2)
-
-    hook_input = _read_stdin_hook_input()
-
-    path = STATE_DIR / f"{window_id}.json"
-    existing = _read_window_json(path)
-    existing["session"] = session
-    existing["window_index"] = window_index
-    existing["status"] = status
-    existing.setdefault("label", "?")
+        if session is not None and window is not None:
+            target_args = ["-t", f"{session}:{window}"]
+        elif pane_target := os.environ.get("TMUX_PANE"):
+            target_args = ["-t", pane_target]
+        else:
+            target_args = []
+        line = tmux(
+            "display-message",
+            *target_args,
+            "-p",
+            "#{window_id}\t#{session_name}\t#{window_index}",
+        )
+        resolved = [tuple(line.split("\t", 2))]
+    if not resolved:
+        return
 
     # Store debug metadata from hook invocation
-    existing["last_hook"] = {
+    last_hook = {
         "event": hook_input.get("hook_event_name"),
         "action": status or "off",
         "agent": agent,
@@ -394,7 +1009,529 @@ def _do_notify(
         "cwd": hook_input.get("cwd"),
     }
 
-    _atomic_write_json(path, existing)
+    with _locked_state() as state:
+        relabel = False
+        for window_id, session, window_index in resolved:
+            existing = state["windows"].setdefault(window_id, {})
+            # A bell doesn't move the window in the picker; a rename or
+            # renumber does.
+            relabel |= (existing.get("session"), existing.get("window_index")) != (
+                session,
+                window_index,
+            )
+            existing["session"] = session
+            existing["window_index"] = window_index
+            existing["status"] = status
+            existing.setdefault("label", "?")
+            existing["last_hook"] = dict(last_hook)
+
+        _save_state(state, relabel)
+
+
+# -- daemon -------------------------------------------------------------------
+
+# Control-mode notifications that only concern the window they name; anything
+# else in NOTIFICATIONS may have moved windows between sessions or indexes.
+WINDOW_NOTIFICATIONS = {
+    "%window-renamed",
+    "%unlinked-window-renamed",
+    "%subscription-changed",
+}
+NOTIFICATIONS = WINDOW_NOTIFICATIONS | {
+    "%window-add",
+    "%window-close",
+    "%unlinked-window-add",
+    "%unlinked-window-close",
+    "%sessions-changed",
+    "%session-renamed",
+    "%session-changed",
+    "%session-window-changed",
+}
+
+# Pane state the labels depend on. tmux reports changes to it at most once a
+# second, and only for windows in the session the daemon is attached to; the
+# hooks' `update` requests cover the rest.
+SUBSCRIPTION = "wf:@*:#{pane_current_command}#{pane_title}#{pane_current_path}"
+
+
+@dataclass
+class _Window:
+    session: str
+    window_index: str
+    label: str
+    # (command, pid, title, path) of the active pane, as last labeled.
+    pane: tuple[str, ...]
+
+
+class _Daemon:
+    """In-memory window table, kept current from tmux control mode and
+    mirrored to the state file for the non-daemon code paths."""
+
+    def __init__(self) -> None:
+        self.windows: dict[str, _Window] = {}
+        self.lock = threading.Lock()
+        self.dirty: set[str] = set()
+        self.wake = threading.Event()
+        # Update requests wait for the first sync started after they came in.
+        self.requested = 0
+        self.synced = 0
+        self.last_stats = _UpdateStats()
+        self.done = threading.Condition(self.lock)
+
+    def sync(self, dirty: set[str] | None) -> _UpdateStats:
+        """Reconcile with tmux. Windows that are new, in *dirty* (all of them
+        if None) or whose active pane changed get relabeled; the rest just
+        have their session and index refreshed. The state file is only
+        rewritten if something changed."""
+        raw = tmux("list-windows", "-a", "-F", WINDOW_FORMAT)
+        procs = None
+        live: set[str] = set()
+        changed: set[str] = set()
+        with self.lock:
+            for line in raw.splitlines():
+                window_id, session, idx, *rest = line.split("\t", 6)
+                pane = tuple(rest)
+                live.add(window_id)
+                known = self.windows.get(window_id)
+                if (
+                    known is None
+                    or dirty is None
+                    or window_id in dirty
+                    or known.pane != pane
+                ):
+                    if procs is None:
+                        procs = _process_tree()
+                    label = get_process_label(*pane, procs)
+                else:
+                    label = known.label
+
+                if known is None:
+                    known = self.windows[window_id] = _Window(session, idx, label, pane)
+                    changed.add(window_id)
+                elif (known.session, known.window_index, known.label) != (
+                    session,
+                    idx,
+                    label,
+                ):
+                    known.session, known.window_index = session, idx
+                    known.label = label
+                    changed.add(window_id)
+                known.pane = pane
+
+            gone = self.windows.keys() - live
+            for window_id in gone:
+                del self.windows[window_id]
+            stats = _UpdateStats(len(live), len(changed), len(gone))
+            if not changed and not gone:
+                return stats
+
+            # Status flags belong to notify, so merge into what's on disk.
+            with _locked_state() as state:
+                windows = state["windows"]
+                for window_id in windows.keys() - live:
+                    del windows[window_id]
+                for window_id in changed:
+                    known = self.windows[window_id]
+                    _set_window(
+                        windows,
+                        window_id,
+                        known.session,
+                        known.window_index,
+                        known.label,
+                    )
+                _save_state(state)
+            return stats
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "update" and not request.get("wait", True):
+            # From a hook, via the fast path, which doesn't log or count.
+            with _traced("update", hook=request.get("hook"), forwarded=True) as event:
+                with self.lock:
+                    # A sync that hasn't started yet will see these windows.
+                    event["coalesced"] = queued = self.wake.is_set()
+                    self.dirty.update(request.get("windows", ()))
+                    self.wake.set()
+                _bump_counters(**{"coalesced" if queued else "runs": 1})
+        elif op == "update":
+            with self.lock:
+                self.dirty.update(request.get("windows", ()))
+                self.requested += 1
+                ticket = self.requested
+                self.wake.set()
+                self.done.wait_for(lambda: self.synced >= ticket, timeout=1.5)
+                return {"stats": asdict(self.last_stats)}
+        return {"ok": True}
+
+    def notify(self, line: str) -> None:
+        """Handle one line of control-mode output."""
+        name, _, rest = line.partition(" ")
+        if name not in NOTIFICATIONS:
+            return
+        if name in WINDOW_NOTIFICATIONS:
+            # %window-renamed @id name / %subscription-changed wf $s @id ...
+            args = rest.split(" ")
+            window_id = args[0] if name != "%subscription-changed" else args[2]
+            with self.lock:
+                self.dirty.add(window_id)
+        self.wake.set()
+
+    def sync_loop(self) -> None:
+        while True:
+            self.wake.wait()
+            time.sleep(DEBOUNCE)
+            self.wake.clear()
+            with self.lock:
+                dirty, self.dirty = self.dirty, set()
+                ticket = self.requested
+                trigger = "update" if ticket > self.synced else "events"
+            stats = _UpdateStats()
+            try:
+                with _traced("sync", trigger=trigger, dirty=len(dirty)) as event:
+                    stats = self.sync(dirty)
+                    event.update(asdict(stats))
+            except (subprocess.CalledProcessError, OSError):
+                pass  # tmux going away; the control client will notice
+            with self.lock:
+                self.synced, self.last_stats = ticket, stats
+                self.done.notify_all()
+
+    def follow(self) -> None:
+        """Attach in control mode and feed notifications until the client
+        exits (its session was killed, or the server stopped)."""
+        proc = subprocess.Popen(
+            ["tmux", "-C", "attach-session", "-f", "no-output,ignore-size"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        proc.stdin.write(f"refresh-client -B '{SUBSCRIPTION}'\n")
+        proc.stdin.flush()
+        in_block = False
+        for line in proc.stdout:
+            line = line.rstrip("\n")
+            # Output of our own commands comes wrapped in %begin/%end.
+            if line.startswith("%begin"):
+                in_block = True
+            elif line.startswith(("%end", "%error")):
+                in_block = False
+            elif not in_block:
+                self.notify(line)
+        proc.wait()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, state: _Daemon) -> None:
+        self.state = state
+        super().__init__(str(path), _RequestHandler)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            reply = self.server.state.handle(json.loads(self.rfile.readline()))
+        except Exception as e:
+            reply = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+def _tmux_has_sessions() -> bool:
+    return subprocess.run(["tmux", "has-session"], capture_output=True).returncode == 0
+
+
+@app.command()
+def daemon(
+    wait: float = typer.Option(
+        10.0,
+        "--wait",
+        help="Seconds to wait for a tmux session to attach to "
+        "(the config is loaded before the first session exists).",
+    ),
+) -> None:
+    """Keep the window table in memory, fed by tmux control mode.
+
+    Exits when tmux has no sessions left, or immediately if a daemon is
+    already running."""
+    if _daemon_request({"op": "ping"}) is not None:
+        return
+    deadline = time.monotonic() + wait
+    while not _tmux_has_sessions():
+        if time.monotonic() > deadline:
+            raise typer.Exit(1)
+        time.sleep(0.2)
+
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    SOCKET_PATH.unlink(missing_ok=True)  # left behind by a daemon that died
+    state = _Daemon()
+    state.sync(None)
+    server = _Server(SOCKET_PATH, state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=state.sync_loop, daemon=True).start()
+    tmux("set-option", "-g", DAEMON_OPTION, "1")
+    try:
+        # With detach-on-destroy off the client moves on when its session is
+        # killed; otherwise it exits and we reattach to whatever is left.
+        while _tmux_has_sessions():
+            state.follow()
+            state.wake.set()
+    finally:
+        subprocess.run(
+            ["tmux", "set-option", "-gu", DAEMON_OPTION], capture_output=True
+        )
+        server.server_close()
+        SOCKET_PATH.unlink(missing_ok=True)
+
+
+# -- stats --------------------------------------------------------------------
+
+
+@app.command()
+def stats(
+    last: int = typer.Option(
+        1000, "--last", "-n", help="How many of the newest logged events to summarize."
+    ),
+) -> None:
+    """Show how many updates ran and how many were coalesced away, and, from
+    the event log, latency percentiles and rates per command and phase."""
+    counters = _read_window_json(COUNTERS_FILE)
+    runs = counters.get("runs", 0)
+    coalesced = counters.get("coalesced", 0)
+    requested = runs + coalesced
+    saved = f" ({coalesced / requested:.0%} saved)" if requested else ""
+    typer.echo(
+        f"updates: {requested} requested, {runs} ran, {coalesced} coalesced{saved}"
+    )
+
+    events = _read_events()[-last:]
+    if not _trace_enabled():
+        typer.echo(f"tracing: off (set {TRACE_ENV}=1 or touch {TRACE_FLAG})")
+    if not events:
+        return
+
+    seconds = max(time.time() - events[0]["ts"], 1)
+    minutes = seconds / 60
+    span = f"{seconds:.0f}s" if seconds < 120 else f"{minutes:.0f} min"
+    typer.echo(f"\nlast {len(events)} events, over {span}:")
+    typer.echo(
+        f"{'':<14}{'count':>7}{'/min':>8}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+    )
+    by_command: dict[str, list[dict]] = {}
+    for event in events:
+        by_command.setdefault(event["command"], []).append(event)
+    for command, group in sorted(by_command.items()):
+        times = [event["ms"] for event in group]
+        errors = sum("error" in event for event in group)
+        typer.echo(
+            f"{command:<14}{len(group):>7}{len(group) / minutes:>8.1f}"
+            f"{_percentile(times, 50):>9.1f}{_percentile(times, 95):>9.1f}"
+            f"{errors:>8}"
+        )
+        # Phases are summarized over the runs that spent time in them.
+        phases: dict[str, list[float]] = {}
+        for event in group:
+            for name, ms in event.get("phases", {}).items():
+                phases.setdefault(name, []).append(ms)
+        for name, times in sorted(phases.items()):
+            typer.echo(
+                f"  {name:<12}{len(times):>7}{'':>8}"
+                f"{_percentile(times, 50):>9.1f}{_percentile(times, 95):>9.1f}"
+            )
+
+    failed = [event for event in events if "error" in event][-5:]
+    if failed:
+        typer.echo("\nrecent errors:")
+    for event in failed:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event["ts"]))
+        typer.echo(f"  {when} {event['command']}: {event['error']}")
+
+
+def _percentile(values: list[float], p: float) -> float:
+    """The nearest-rank *p*th percentile of *values*."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+# -- bench --------------------------------------------------------------------
+
+
+def _synthetic_processes(
+    total: int, panes: int, depth: int
+) -> tuple[list[tuple[int, int, str]], list[str]]:
+    """A process table of *total* (pid, ppid, comm) rows: *panes* shells
+    under a tmux server, each running a *depth*-long chain of tools (every
+    third ending in an AI tool), and unrelated processes making up the rest.
+    Returns the table and the pane pids."""
+    rng = random.Random(0)
+    table = [(1, 0, "init"), (2, 1, "tmux: server")]
+    pane_pids: list[str] = []
+    for i in range(panes):
+        parent = len(table) + 1
+        table.append((parent, 2, "zsh"))
+        pane_pids.append(str(parent))
+        for _ in range(depth):
+            pid = len(table) + 1
+            table.append((pid, parent, rng.choice(["uv", "node", "python3", "make"])))
+            parent = pid
+        if i % 3 == 0:
+            table.append((len(table) + 1, parent, "claude"))
+    others = [1]
+    while len(table) < total:
+        pid = len(table) + 1
+        table.append((pid, rng.choice(others), rng.choice(["sshd", "bash", "java"])))
+        others.append(pid)
+    return table, pane_pids
+
+
+def _write_fake_proc(root: Path, table: list[tuple[int, int, str]]) -> None:
+    children: dict[int, list[int]] = {}
+    for pid, ppid, _ in table:
+        children.setdefault(ppid, []).append(pid)
+    for pid, _, comm in table:
+        task = root / str(pid) / "task" / str(pid)
+        task.mkdir(parents=True)
+        # The kernel's format: space-terminated pids.
+        (task / "children").write_text("".join(f"{c} " for c in children.get(pid, [])))
+        (root / str(pid) / "comm").write_text(comm + "\n")
+
+
+def _time_labels(make_tree: Callable[[], _ProcessTree], pane_pids: list[str]) -> float:
+    """Best-of-5 seconds to build a tree and find every pane's AI tool."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        procs = make_tree()
+        for pid in pane_pids:
+            find_ai_tool(pid, procs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@app.command("bench-procs", hidden=True)
+def bench_procs(
+    processes: int = typer.Option(5000, "--processes", "-n"),
+    panes: int = typer.Option(30, "--panes"),
+    depth: int = typer.Option(4, "--depth"),
+) -> None:
+    """Compare process tree backends on a synthetic process table, and on this
+    host's live tmux panes."""
+    table, pane_pids = _synthetic_processes(processes, panes, depth)
+    ps_output = "".join(f"{pid:>7} {ppid:>7} {comm}\n" for pid, ppid, comm in table)
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_fake_proc(Path(tmp), table)
+        proc = _time_labels(lambda: _ProcTree(tmp), pane_pids)
+    parse = _time_labels(lambda: _PsTree(ps_output), pane_pids)
+    typer.echo(f"synthetic: {len(table)} processes, {panes} panes")
+    typer.echo(f"  /proc walk        {proc * 1000:8.2f}ms")
+    typer.echo(f"  ps parse only     {parse * 1000:8.2f}ms  (excludes running ps)")
+
+    # On the real box ps also has to read every process's stat from /proc.
+    host = _time_labels(_PsTree, [])
+    typer.echo(f"  ps -e, this host  {host * 1000:8.2f}ms  (for comparison)")
+
+    try:
+        live_panes = tmux("list-panes", "-a", "-F", "#{pane_pid}").split()
+    except (subprocess.CalledProcessError, OSError):
+        return
+    typer.echo(f"live: {len(live_panes)} tmux panes")
+    if os.path.exists(f"/proc/self/task/{os.getpid()}/children"):
+        proc = _time_labels(_ProcTree, live_panes)
+        typer.echo(f"  /proc walk        {proc * 1000:8.2f}ms")
+    parse = _time_labels(_PsTree, live_panes)
+    typer.echo(f"  ps -e             {parse * 1000:8.2f}ms")
+
+
+# What tmux-window-finder-fzf does before handing the view to fzf.
+_PICKER_READ = """
+active=$(tmux display-message -p '#{session_name}:#{window_index}')
+awk -F'\\t' -v t="$active" '$2 == t { print NR; exit }' "$0"
+cat "$0"
+"""
+
+
+@app.command("bench-lookup", hidden=True)
+def bench_lookup(
+    runs: int = typer.Option(50, "--runs", "-n"),
+    target: float = typer.Option(10.0, "--target", help="Target p50 in ms."),
+) -> None:
+    """Time getting the picker's lines: the fzf script reading the view
+    directly (held to --target), and `lookup` in a fresh interpreter (without
+    uv's own startup), which can't beat starting Python and compiling this
+    file."""
+    if not VIEW_FILE.exists():
+        _do_update()
+
+    def time_runs(argv: list[str]) -> tuple[float, float]:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(argv, capture_output=True, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        return times[len(times) // 2], times[int(len(times) * 0.95)]
+
+    for name, argv in [
+        ("picker read", ["sh", "-c", _PICKER_READ, str(VIEW_FILE)]),
+        ("interpreter", [sys.executable, "-c", "pass"]),
+        ("lookup", [sys.executable, __file__, "lookup"]),
+    ]:
+        p50, p95 = time_runs(argv)
+        typer.echo(f"{name:<12} p50 {p50:6.1f}ms, p95 {p95:6.1f}ms")
+        if name == "picker read" and p50 > target:
+            typer.echo(f"picker read is over the {target:.0f}ms target", err=True)
+            raise typer.Exit(1)
+
+
+# -- stress -------------------------------------------------------------------
+
+
+@app.command("stress-notify", hidden=True)
+def stress_notify(
+    windows: int = typer.Option(200, "--windows", "-w"),
+    updates: int = typer.Option(20, "--updates", help="Updates racing the notifies."),
+) -> None:
+    """Fire one notify per window of a scratch tmux session, all at once and
+    with updates racing them, and check that every window ends up with the
+    status it was sent. Each window gets a single notify per round, so a
+    lost write can't be papered over by a later one."""
+    session = f"wf-stress-{os.getpid()}"
+    tmux("new-session", "-d", "-s", session, "sleep 600")
+    lost = 0
+    try:
+        for _ in range(windows - 1):
+            tmux("new-window", "-d", "-t", session, "sleep 600")
+        targets = tmux("list-windows", "-t", session, "-F", "#{window_index}").split()
+        command = [sys.executable, __file__]
+        rounds = [("--on", "notify"), ("--working", "working"), ("--off", None)]
+        for flag, expected in rounds:
+            procs = []
+            for i, target in enumerate(targets):
+                procs.append(
+                    subprocess.Popen(
+                        [*command, "notify", flag, "-s", session, "-w", target],
+                        stdin=subprocess.DEVNULL,
+                    )
+                )
+                if i % max(len(targets) // max(updates, 1), 1) == 0:
+                    procs.append(subprocess.Popen([*command, "update", "--wait"]))
+            for proc in procs:
+                proc.wait()
+
+            statuses = {
+                record.get("window_index"): record.get("status")
+                for record in _load_state()["windows"].values()
+                if record.get("session") == session
+            }
+            missed = [t for t in targets if statuses.get(t, "missing") != expected]
+            lost += len(missed)
+            typer.echo(f"{flag:<10} {len(targets)} notifies: {len(missed)} lost")
+    finally:
+        tmux("kill-session", "-t", session)
+        _coalesced_update(0, wait=True)
+    if lost:
+        raise typer.Exit(1)
 
 
 # -- main ---------------------------------------------------------------------
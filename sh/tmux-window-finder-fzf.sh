@@ -5,9 +5,18 @@
 #   ctrl-b - clear bell on selected window(s)
 #   ctrl-r - refresh window list
 
-tmux-window-finder lookup >/tmp/tmux-wf-list 2>/tmp/tmux-wf-pos || exit 0
-
-POS=$(cat /tmp/tmux-wf-pos)
+# Read the view update/notify keep next to the state directly when it exists;
+# starting tmux-window-finder costs more than everything else here.
+VIEW="$HOME/.local/state/tmux-window-finder/view.tsv"
+if [ -f "$VIEW" ]; then
+  cp "$VIEW" /tmp/tmux-wf-list
+  ACTIVE=$(tmux display-message -p '#{session_name}:#{window_index}')
+  POS=$(awk -F'\t' -v t="$ACTIVE" '$2 == t { print NR; exit }' /tmp/tmux-wf-list)
+  POS=${POS:-1}
+else
+  tmux-window-finder lookup >/tmp/tmux-wf-list 2>/tmp/tmux-wf-pos || exit 0
+  POS=$(cat /tmp/tmux-wf-pos)
+fi
 
 TARGET=$(cat /tmp/tmux-wf-list | fzf-tmux -p \
   --with-nth=1 \
@@ -19,9 +28,9 @@ TARGET=$(cat /tmp/tmux-wf-list | fzf-tmux -p \
   --header 'ctrl-d: kill · ctrl-b: clear bell · ctrl-r: refresh' \
   --bind "load:pos($POS)" \
   --bind 'esc:transform:[[ -z {q} ]] && echo abort || echo clear-query' \
-  --bind "ctrl-r:reload(tmux-window-finder update && tmux-window-finder lookup 2>/dev/null)" \
-  --bind "ctrl-b:execute-silent(cat {+f} | cut -f2 | xargs -I{} sh -c 'tmux-window-finder notify --off -s \"\${1%%:*}\" -w \"\${1#*:}\"' _ {})+reload(tmux-window-finder lookup 2>/dev/null)+clear-multi" \
-  --bind "ctrl-d:execute-silent(cat {+f} | cut -f2 | xargs -I{} tmux kill-window -t {})+reload(tmux-window-finder update && tmux-window-finder lookup 2>/dev/null)+clear-multi" \
+  --bind "ctrl-r:reload(tmux-window-finder update --wait && cat \"$VIEW\")" \
+  --bind "ctrl-b:execute-silent(cut -f2 {+f} | tmux-window-finder notify --off --stdin)+reload(cat \"$VIEW\")+clear-multi" \
+  --bind "ctrl-d:execute-silent(cat {+f} | cut -f2 | xargs -I{} tmux kill-window -t {})+reload(tmux-window-finder update --wait && cat \"$VIEW\")+clear-multi" \
   --bind 'zero:ignore' \
   | cut -f2)
 